@@ -3,7 +3,18 @@ from . import draw_gpu
 from . import operators
 from . import ui
 from . import node_properties
-from .preferences import NodeNoteAddonPreferences
+from . import font_metrics
+from . import templates
+from . import registry
+from . import dirty
+from . import cache_manager
+from . import warmup
+from . import note_list
+from . import thumbnails
+from . import search_index
+from . import group_graph
+from . import rollup
+from .preferences import NodeNoteAddonPreferences, invalidate_draw_settings
 from .translations import translations_dict
 
 addon_keymaps = []
@@ -19,14 +30,28 @@ def register():
     for cls in classes:
         bpy.utils.register_class(cls)
     operators.register()
+    cache_manager.register()
     draw_gpu.register_draw_handler()
+    templates.register()
+    registry.register()
+    dirty.register()
+    note_list.register()
+    thumbnails.register()
+    search_index.register()
+    group_graph.register()
+    rollup.register()
     node_properties.init_props()
+    node_properties.register()
+    warmup.register()
     
     kc = bpy.context.window_manager.keyconfigs.addon
     if kc:
         km = kc.keymaps.new(name='Node Editor', space_type='NODE_EDITOR')
         kmi = km.keymap_items.new("node.note_quick_edit", 'D', 'PRESS', ctrl=True)
         addon_keymaps.append((km, kmi))
+        # 没点中笔记时放行, 不影响节点编辑器自带的点击选择
+        kmi = km.keymap_items.new("node.note_drag", 'LEFTMOUSE', 'PRESS')
+        addon_keymaps.append((km, kmi))
     
     bpy.types.NODE_MT_context_menu.append(ui.draw_to_context_menu)
     bpy.types.NODE_PT_overlay.append(ui.draw_to_overlay_panel)
@@ -41,10 +66,23 @@ def unregister():
             km.keymap_items.remove(kmi)
     addon_keymaps.clear()
 
+    warmup.unregister()
+    rollup.unregister()
+    group_graph.unregister()
+    search_index.unregister()
+    thumbnails.unregister()
+    note_list.unregister()
+    dirty.unregister()
+    registry.unregister()
+    templates.unregister()
     draw_gpu.unregister_draw_handler()
+    invalidate_draw_settings()
+    cache_manager.unregister()
+    font_metrics.unregister()
     operators.unregister()
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
+    node_properties.unregister()
     node_properties.delete_props()
 
     bpy.app.translations.unregister(__package__)
@@ -0,0 +1,68 @@
+import bpy
+from dataclasses import dataclass
+from typing import Callable
+from bpy.app.handlers import persistent
+from bpy.types import Depsgraph
+
+# 插件所有缓存的统一失效入口
+# 撤销/重做/加载文件会重新分配 ID 和节点指针, 以指针为键的缓存必须全部清空;
+# 依赖图更新交给各缓存自己判断需要失效哪些条目. 新增缓存时在这里登记, 不要再单独挂 handler
+
+@dataclass
+class CacheSpec:
+    name: str
+    clear: Callable[[], None]
+    """ 撤销/重做/加载文件时整体清空 """
+    on_depsgraph: Callable[[Depsgraph], int] | None = None
+    """ 依赖图更新时按需失效, 返回失效的条目数 """
+
+_caches: dict[str, CacheSpec] = {}
+invalidation_counts: dict[str, int] = {}
+""" 调试用: 每个缓存累计失效次数 """
+
+def register_cache(name: str, clear: Callable[[], None], on_depsgraph: Callable[[Depsgraph], int] | None = None) -> None:
+    _caches[name] = CacheSpec(name, clear, on_depsgraph)
+    invalidation_counts.setdefault(name, 0)
+
+def unregister_cache(name: str) -> None:
+    spec = _caches.pop(name, None)
+    if spec is not None:
+        spec.clear()
+
+def invalidate(name: str | None = None) -> None:
+    """清空指定缓存, 不指定时清空全部"""
+    for spec in ([_caches[name]] if name else list(_caches.values())):
+        spec.clear()
+        invalidation_counts[spec.name] += 1
+
+def total_invalidations() -> int:
+    return sum(invalidation_counts.values())
+
+def debug_report() -> str:
+    return ", ".join(f"{name}: {count}" for name, count in invalidation_counts.items())
+
+@persistent
+def _on_load_or_undo(*args) -> None:
+    invalidate()
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph: Depsgraph) -> None:
+    for spec in list(_caches.values()):
+        if spec.on_depsgraph is not None:
+            invalidation_counts[spec.name] += spec.on_depsgraph(depsgraph)
+
+_reset_handlers = (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post)
+
+def register() -> None:
+    for handlers in _reset_handlers:
+        handlers.append(_on_load_or_undo)
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+
+def unregister() -> None:
+    for handlers in _reset_handlers:
+        if _on_load_or_undo in handlers:
+            handlers.remove(_on_load_or_undo)
+    if _on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    invalidate()
+    _caches.clear()
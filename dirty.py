@@ -0,0 +1,105 @@
+import bpy
+from bpy.types import Node, NodeTree
+from . import cache_manager
+from .note_data import note_uuid
+
+# 变化追踪: 笔记属性的 update 回调和 msgbus 订阅给改动的节点打上递增的时间戳
+# 缓存记录计算时的时间戳, 之后只要节点/节点树/全局时间戳没有变大就可以复用
+# msgbus 只在 RNA 修改(界面/Python)时通知, 拖动节点等操作不经过它, 绘制端另外比较节点矩形兜底
+
+WatchedProps = ("location", "width", "label", "parent", "hide")
+""" 通过 msgbus 监听的节点属性 """
+
+_stamp = 0
+_global_stamp = 0
+_tree_stamps: dict[int, int] = {}
+_node_stamps: dict[int, dict[str, int]] = {}
+""" 节点树指针 -> 笔记标识 -> 最近一次改动的时间戳 """
+_content_stamps: dict[int, int] = {}
+""" 节点树指针 -> 笔记内容(文本/图片/分类/置顶, 不含样式和几何)最近一次改动的时间戳 """
+_content_generation = 0
+_watched: dict[int, set[str]] = {}
+""" 已订阅 msgbus 的笔记标识 """
+_msgbus_owner = object()
+
+def _next_stamp() -> int:
+    global _stamp
+    _stamp += 1
+    return _stamp
+
+def current_stamp() -> int:
+    return _stamp
+
+def mark_node(node: Node) -> None:
+    mark_note(node.id_data.as_pointer(), note_uuid(node))
+
+def mark_note(tree_ptr: int, uid: str) -> None:
+    _node_stamps.setdefault(tree_ptr, {})[uid] = _next_stamp()
+
+def mark_content(node: Node) -> None:
+    """笔记内容变化, 除了排版还会影响节点组的笔记汇总"""
+    global _content_generation
+    tree_ptr = node.id_data.as_pointer()
+    mark_note(tree_ptr, note_uuid(node))
+    _content_stamps[tree_ptr] = _content_generation = _stamp
+
+def mark_tree(tree: NodeTree) -> None:
+    global _content_generation
+    _tree_stamps[tree.as_pointer()] = _content_generation = _next_stamp()
+
+def tree_stamp(tree_ptr: int) -> int:
+    """节点树整体最近一次改动的时间戳"""
+    return _tree_stamps.get(tree_ptr, 0)
+
+def content_stamp(tree_ptr: int) -> int:
+    """节点树中笔记内容最近一次改动的时间戳"""
+    return max(_content_stamps.get(tree_ptr, 0), _tree_stamps.get(tree_ptr, 0))
+
+def content_generation() -> int:
+    """任意节点树中笔记内容最近一次改动的时间戳"""
+    return _content_generation
+
+def mark_all() -> None:
+    """影响所有笔记的变化(偏好设置/字体)"""
+    global _global_stamp
+    _global_stamp = _next_stamp()
+
+def is_dirty(tree_ptr: int, uid: str, since: int) -> bool:
+    """笔记在时间戳 since 之后是否有改动"""
+    if _global_stamp > since or _tree_stamps.get(tree_ptr, 0) > since:
+        return True
+    return _node_stamps.get(tree_ptr, {}).get(uid, 0) > since
+
+def _on_node_changed(tree_ptr: int, uid: str) -> None:
+    mark_note(tree_ptr, uid)
+
+def watch_nodes(tree: NodeTree, nodes: list[Node]) -> None:
+    """为尚未订阅的笔记节点订阅几何/标签/父级变化"""
+    tree_ptr = tree.as_pointer()
+    watched = _watched.setdefault(tree_ptr, set())
+    for node in nodes:
+        uid = note_uuid(node)
+        if uid in watched: continue
+        watched.add(uid)
+        for prop in WatchedProps:
+            bpy.msgbus.subscribe_rna(
+                key=node.path_resolve(prop, False),
+                owner=_msgbus_owner,
+                args=(tree_ptr, uid),
+                notify=_on_node_changed,
+            )
+
+def clear_dirty_state() -> None:
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    _watched.clear()
+    _node_stamps.clear()
+    _tree_stamps.clear()
+    _content_stamps.clear()
+    mark_all()
+
+def register() -> None:
+    # 撤销和加载文件后指针失效, msgbus 订阅也随之失效
+    cache_manager.register_cache("dirty", clear_dirty_state)
+
+def unregister() -> None:
+    cache_manager.unregister_cache("dirty")
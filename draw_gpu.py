@@ -1,53 +1,66 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import bpy
 import blf
 import gpu
 from gpu_extras.batch import batch_for_shader
 from bpy.types import Image, NodeTree, SpaceNodeEditor
 from gpu.types import GPUShader, GPUTexture
-from mathutils import Vector as Vec2
 import math
 import numpy as np
 import os
-from .nn_typing import NotedNode, float2, int3, RGBA, AlignMode, TextWidthMode, BadgeScaleMode
-from .preferences import pref
+from .nn_typing import NotedNode, float2, int3, RGBA, BadgeScaleMode
+from .preferences import DrawSettings, get_draw_settings
+from .font_metrics import BlfMetrics
+from .templates import display_text
+from .node_snapshot import NodeSnapshot, NodeHierarchy, take_snapshot
+from .registry import noted_indices
+from . import dirty
+from . import cache_manager
+from . import hit_index
+from .rollup import NoteRollup, group_rollups
+from .hit_index import HitIndex
+from .layout import PaddingX, LineHeight, NoteRecord, NoteLayout, LayoutParams, layout_note, visible_line_range
 from .utils import (
-    ui_scale,
-    nd_abs_loc,
-    node_depth,
-    get_region_zoom,
-    text_split_lines,
-    view_to_region_scaled,
-    check_color_visibility,
+    ViewTransform,
+    get_view_transform,
     get_node_screen_rect,
 )
 
 # region 常量
 
-PaddingX = 2
-MinAutoWidth = 101
 CornerRadius = 2.0
 CornerScaleY = 1.1
 DefaultBg = (0.2, 0.3, 0.5, 0.9)
+RollupBg = (0.1, 0.1, 0.1, 0.8)
+RollupCategories = 3
+""" 节点组汇总显示的分类数 """
 
 handler = None
 _shader_cache: dict[str, GPUShader] = {}
-_manual_texture_cache: dict[str, GPUTexture] = {}
+_manual_texture_cache: dict[int, GPUTexture] = {}
+""" 图片指针 -> 手动创建的纹理 """
 _font_id: int = 0
 _font_path: str = ""
+_font_metrics = BlfMetrics(0)
 
 def get_font_id() -> int:
     """获取全局字体 ID"""
-    global _font_id, _font_path
-    font_path = pref().font_path
+    global _font_id, _font_path, _font_metrics
+    font_path = get_draw_settings().font_path
     if font_path != _font_path:
         _font_path = font_path
         if font_path and os.path.exists(font_path):
             _font_id = blf.load(font_path) or 0
         else:
             _font_id = 0
+        _font_metrics = BlfMetrics(_font_id, font_path if _font_id else "")
     return _font_id
 
+def get_font_metrics() -> BlfMetrics:
+    """获取全局字体度量"""
+    get_font_id()
+    return _font_metrics
+
 # region 数据类
 
 @dataclass
@@ -58,6 +71,41 @@ class DrawParams:
     badge_radius: float
     arrow_size: float
     badge_font_size: float
+    layout: LayoutParams
+    region_height: float
+    view: ViewTransform
+    settings: DrawSettings
+
+@dataclass
+class CachedNote:
+    """上一帧的笔记排版结果"""
+    stamp: int
+    """ 计算时的变化时间戳 """
+    rect: tuple[float, float, float, float]
+    is_visible: bool
+    layout: NoteLayout
+    cacheable: bool
+    """ 文本块内容的修改不会触发回调, 不能复用 """
+
+@dataclass
+class RegionCache:
+    """每个编辑器区域的排版缓存, 视图变化时整体失效"""
+    tree_ptr: int = 0
+    view: ViewTransform | None = None
+    layout: LayoutParams | None = None
+    region_height: float = 0
+    notes: dict[str, CachedNote] = field(default_factory=dict)
+    """ 笔记标识 -> 排版缓存 """
+
+_region_caches: dict[int, RegionCache] = {}
+
+def _get_region_cache(tree: NodeTree, params: "DrawParams") -> RegionCache:
+    cache = _region_caches.setdefault(bpy.context.region.as_pointer(), RegionCache())
+    tree_ptr = tree.as_pointer()
+    if (cache.tree_ptr, cache.view, cache.layout, cache.region_height) != (tree_ptr, params.view, params.layout, params.region_height):
+        cache.tree_ptr, cache.view, cache.layout, cache.region_height = tree_ptr, params.view, params.layout, params.region_height
+        cache.notes.clear()
+    return cache
 
 @dataclass
 class BadgeInfo:
@@ -65,41 +113,6 @@ class BadgeInfo:
     pos: float2
     note_badge_color: RGBA
 
-@dataclass
-class TextImgInfo:
-    """文本和图像的尺寸、纹理与位置 屏幕空间 信息"""
-    node: NotedNode | None = None
-    top_y: float = 0
-    bottom_y: float = 0
-    left_x: float = 0
-    right_x: float = 0
-    loc: Vec2 = Vec2((0, 0))
-    """ 节点屏幕空间位置 """
-
-    txt_width: float = 0
-    """ 文本背景宽度 """
-    txt_height: float = 0
-    """ 文本背景高度 """
-    txt_lines: list[str] | None = None
-    """ 换行后的文本内容 """
-    txt_font_size: int = 0
-
-    img_width: float = 0
-    img_height: float = 0
-    img_texture: GPUTexture | None = None
-
-    txt_x: float = 0
-    """ 文本注释左上角X """
-    txt_y: float = 0
-    img_x: float = 0
-    """ 图像注释左上角X """
-    img_y: float = 0
-    txt_should_draw: bool = False
-    img_should_draw: bool = False
-    
-    txt_scale: float = 1.0
-    img_scale: float = 1.0
-
 # region 基础工具函数
 
 def get_shader(name: str) -> GPUShader | None:
@@ -167,8 +180,7 @@ def get_gpu_texture(image: Image) -> GPUTexture | None:
     return create_texture_from_pixels(image)
 
 def create_texture_from_pixels(image: Image) -> GPUTexture | None:
-    global _manual_texture_cache
-    cache_key = image.name
+    cache_key = image.as_pointer()
     if cache_key in _manual_texture_cache:
         return _manual_texture_cache[cache_key]
     try:
@@ -181,31 +193,17 @@ def create_texture_from_pixels(image: Image) -> GPUTexture | None:
     except:
         return None
 
-def _wrap_text_pure(font_id: int, text: str, max_width: float):
-    lines: list[str] = []
-    for para in text_split_lines(text):
-        curr_line, curr_w = "", 0
-        if not para:
-            lines.append("")
-            continue
-        for char in para:
-            char_width = blf.dimensions(font_id, char)[0]
-            if curr_w + char_width > max_width and curr_line:
-                lines.append(curr_line)
-                curr_line = char
-                curr_w = char_width
-            else:
-                curr_line += char
-                curr_w += char_width
-        if curr_line: lines.append(curr_line)
-    return lines
-
-def _get_draw_params() -> DrawParams:
-    """获取绘制参数"""
+def layout_params(view: ViewTransform, prefs: DrawSettings) -> LayoutParams:
+    """排版参数只取决于视图和绘制设置"""
+    scale = view.zoom * bpy.context.preferences.view.ui_scale
+    return LayoutParams(scale, view.ui_scale, view.scale_x, prefs.line_separator, prefs.use_markup)
+
+def _get_draw_params(prefs: DrawSettings) -> DrawParams:
+    """获取绘制参数, 每帧开始时计算一次"""
     context = bpy.context
-    prefs = pref()
     # 缩放计算
-    zoom = get_region_zoom(context)
+    view = get_view_transform(context)
+    zoom = view.zoom
     prefs_ui_scale = context.preferences.view.ui_scale
     scale = zoom * prefs_ui_scale
     # scale = ui_scale()
@@ -222,7 +220,7 @@ def _get_draw_params() -> DrawParams:
         arrow_size = 8 * badge_rel_scale * scale
         badge_font_size = 8 * badge_rel_scale * scale
     elif badge_scale_mode == 'ABSOLUTE':
-        max_diameter = view_to_region_scaled(140, 0)[0] - view_to_region_scaled(0, 0)[0]
+        max_diameter = 140 * view.scale_x
         badge_radius = min(7 * 2, max_diameter / 2) * badge_abs_scale
         arrow_size = min(16, max_diameter * 0.6) * badge_abs_scale
         badge_font_size = min(16, max_diameter / 2) * badge_abs_scale
@@ -230,48 +228,19 @@ def _get_draw_params() -> DrawParams:
         badge_radius = 7 * scale
         arrow_size = 8 * scale
         badge_font_size = 8 * scale
+    layout = layout_params(view, prefs)
     return DrawParams(
         scale,
         occluders,
         badge_radius,
         arrow_size,
         badge_font_size,
+        layout,
+        context.region.height,
+        view,
+        prefs,
     )
 
-def _wrap_text(font_id: int, text: str, txt_width_mode: TextWidthMode, note_width: float, pad: float) -> list[str]:
-    """文本换行处理"""
-    if txt_width_mode in {'FIT', 'KEEP'}:
-        return text_split_lines(text)
-    else:
-        return _wrap_text_pure(font_id, text, max(1, note_width - pad*2))
-
-def _calc_note_pos(info: TextImgInfo, alignment: AlignMode, offset_vec: float2, self_width: float, self_height: float,
-                   scale: float) -> float2:
-    """计算元素位置"""
-    base_x = info.left_x
-    base_y = info.top_y
-    bottom_y = info.bottom_y
-    right_x = info.right_x
-
-    offset_x = offset_vec[0] * scale
-    offset_y = offset_vec[1] * scale
-    margin = 2
-
-    if alignment == 'TOP':
-        pos_x = base_x
-        pos_y = base_y + margin*scale
-    elif alignment == 'BOTTOM':
-        pos_x = base_x
-        pos_y = bottom_y - margin*scale - self_height
-    elif alignment == 'LEFT':
-        pos_x = base_x - margin*scale - self_width
-        pos_y = base_y - self_height
-    elif alignment == 'RIGHT':
-        pos_x = right_x + margin*scale
-        pos_y = base_y - self_height
-
-    return pos_x + offset_x, pos_y + offset_y
-
 # region 基础绘制函数
 
 def draw_rounded_rect_batch(x: float, y: float, width: float, height: float, color: RGBA, radius: float = 3.0) -> None:
@@ -343,18 +312,18 @@ def draw_circle_batch(pos: float2, radius: float, color: RGBA) -> None:
     gpu.state.blend_set('ALPHA')
     batch.draw(shader)
 
-def draw_lines_batch(points: list[float2], thickness: int) -> None:
+def draw_lines_batch(points: list[float2], thickness: int, color: RGBA) -> None:
     if len(points) < 2: return
     shader = get_shader('UNIFORM_COLOR')
     if not shader: return
     gpu.state.line_width_set(thickness)
     batch = batch_for_shader(shader, 'LINES', {"pos": points})
     shader.bind()
-    shader.uniform_float("color", pref().badge_line_color)
+    shader.uniform_float("color", color)
     gpu.state.blend_set('ALPHA')
     batch.draw(shader)
 
-def draw_arrow_head(start_point: float2, end_point: float2, size: float, retreat: float) -> None:
+def draw_arrow_head(start_point: float2, end_point: float2, size: float, retreat: float, color: RGBA) -> None:
     shader = get_shader('UNIFORM_COLOR')
     if not shader: return
     x1, y1 = start_point
@@ -378,13 +347,11 @@ def draw_arrow_head(start_point: float2, end_point: float2, size: float, retreat
     vertices = [v1, v2, v3]
     batch = batch_for_shader(shader, 'TRIS', {"pos": vertices})
     shader.bind()
-    shader.uniform_float("color", pref().badge_line_color)
+    shader.uniform_float("color", color)
     gpu.state.blend_set('ALPHA')
     batch.draw(shader)
 
-def draw_texture_batch(info: TextImgInfo) -> None:
-    if not info.img_texture: return
-
+def draw_texture_batch(info: NoteLayout, texture: GPUTexture) -> None:
     shader = get_image_shader()
     x, y, w, h = info.img_x, info.img_y, info.img_width, info.img_height
     vertices = ((x, y), (x + w, y), (x + w, y + h), (x, y + h))
@@ -392,225 +359,108 @@ def draw_texture_batch(info: TextImgInfo) -> None:
     indices = ((0, 1, 2), (2, 3, 0))
     batch = batch_for_shader(shader, 'TRIS', {"pos": vertices, "texCoord": uvs}, indices=indices)
     shader.bind()
-    shader.uniform_sampler("image", info.img_texture)
+    shader.uniform_sampler("image", texture)
     gpu.state.blend_set('ALPHA')
     batch.draw(shader)
     gpu.state.blend_set('NONE')
 
-def draw_image_error_placeholder(info: TextImgInfo) -> None:
+def draw_image_error_placeholder(info: NoteLayout) -> None:
     draw_rounded_rect_batch(info.img_x, info.img_y, max(info.img_width, 70), 70, (1, 0.2, 1, 1))
 
 # region 辅助函数
 
-def _get_node_info(node: NotedNode) -> TextImgInfo:
-    """计算节点位置信息"""
-    loc = nd_abs_loc(node)
-    height = node.dimensions.y / ui_scale()
-    top_y = loc.y + (height/2 - 9) if node.hide else loc.y
-    bottom_y = loc.y - (height/2 + 9) if node.hide else (loc.y - height)
-
+def _get_node_rects(snap: NodeSnapshot, locations: np.ndarray, view: ViewTransform) -> np.ndarray:
+    """一次性计算所有节点屏幕空间矩形 (n, 4): left_x, top_y, right_x, bottom_y"""
+    loc_x, loc_y = locations[:, 0], locations[:, 1]
+    height = snap.dimensions[:, 1] / view.ui_scale
+    top_y = np.where(snap.hide, loc_y + (height/2 - 9), loc_y)
+    bottom_y = np.where(snap.hide, loc_y - (height/2 + 9), loc_y - height)
+    corners = np.stack((loc_x, top_y, loc_x + snap.width, bottom_y), axis=-1).reshape(-1, 2, 2)
     # Screen Space
-    left_x, top_y = view_to_region_scaled(loc.x, top_y)
-    right_x, bottom_y = view_to_region_scaled(loc.x + node.width, bottom_y)
-
-    return TextImgInfo(
-        node=node,
-        top_y=top_y,
-        bottom_y=bottom_y,
-        left_x=left_x,
-        right_x=right_x,
-        loc=loc,
-    )
+    return view.to_region_array(corners).reshape(-1, 4)
 
-def _set_text_note_info(info: TextImgInfo, scale: float, is_visible: bool) -> None:
-    """设置文本注释的尺寸和换行信息"""
-    node = info.node
-    text = node.note_text
-    show_txt = node.note_show_txt
-
-    if not (text and show_txt and is_visible):
-        return
-
-    txt_width_mode = node.note_txt_width_mode
-    current_scale = ui_scale() if txt_width_mode == 'KEEP' else scale
-
-    if txt_width_mode == 'KEEP':
-        depth = node_depth(node)  # type: ignore
-        if depth > 0:
-            current_scale *= (0.75 ** depth)  # todo 如果需要,可以偏好设置自定义
-
-    info.txt_scale = current_scale
-
-    pad = PaddingX * current_scale
-    node_width_px = info.right_x - info.left_x
-    loc = info.loc
-
-    fs = max(1, int(node.note_font_size * current_scale))
-    
-    # 计算宽度
-    if txt_width_mode in {'FIT', 'KEEP'} and text:
-        font_id = get_font_id()
-        blf.size(font_id, fs)
-        max_line_w = max(blf.dimensions(font_id, line)[0] for line in text_split_lines(text))
-        note_width = max_line_w + (pad * 2)
-    elif txt_width_mode == 'AUTO':
-        min_w = view_to_region_scaled(loc[0] + MinAutoWidth, loc[1])[0] - info.left_x
-        note_width = max(node_width_px, min_w)
-    else:
-        note_width = view_to_region_scaled(loc[0] + node.note_txt_bg_width, loc[1])[0] - info.left_x
-
-    # 文本换行
-    font_id = get_font_id()
-    blf.size(font_id, fs)
-    lines = text_split_lines(text) if txt_width_mode in {'FIT', 'KEEP'} else _wrap_text(font_id, text, txt_width_mode, note_width, pad)
-    text_note_height = (len(lines) * fs * 1.3) + pad * 2 if lines else 0
-
-    info.txt_width = note_width
-    info.txt_height = text_note_height
-    info.txt_lines = lines
-    info.txt_font_size = fs
-    info.txt_should_draw = True
-
-def _set_image_note_info(info: TextImgInfo, scale: float) -> None:
-    """设置图像注释的尺寸和纹理信息"""
-    node = info.node
+def note_record(node: NotedNode, snap: NodeSnapshot, hierarchy: NodeHierarchy, i: int) -> NoteRecord:
+    """组合快照中的数值属性和单独读取的字符串/枚举/图片, 供排版核心使用"""
     img = node.note_image
-    show_img = node.note_show_img
-
-    if not (img and show_img):
-        return
-
-    img_width_mode = node.note_img_width_mode
-    current_scale = ui_scale() if img_width_mode == 'KEEP' else scale
-    info.img_scale = current_scale
-
-    node_width_px = info.right_x - info.left_x
-    loc = info.loc
-    ref_width = max(node_width_px, (view_to_region_scaled(loc[0] + MinAutoWidth, loc[1])[0] - info.left_x))
-
-    # 计算宽度
-    if img_width_mode == 'ORIGINAL':
-        base_width = img.size[0] * scale
-    elif img_width_mode == 'AUTO':
-        base_width = ref_width
-    elif img_width_mode == 'KEEP':
-        base_width = node.note_img_width * ui_scale()
-    else:
-        base_width = view_to_region_scaled(loc[0] + node.note_img_width, loc[1])[0] - info.left_x
-
-    img_draw_h = base_width * (img.size[1] / img.size[0]) if img.size[0] > 0 else 0
-    texture = get_gpu_texture(img) if img.size[0] > 0 else None
-
-    info.img_width = base_width
-    info.img_height = img_draw_h
-    info.img_texture = texture
-    info.img_should_draw = True
-
-def _set_note_position(info: TextImgInfo, scale: float) -> None:
-    def _set_stacked_position(info: TextImgInfo, scale: float, alignment: AlignMode) -> None:
-        """计算堆叠情况下的元素位置"""
-        node = info.node
-        swap = node.note_swap_order
-        txt_w, txt_h = info.txt_width, info.txt_height
-        img_w, img_h = info.img_width, info.img_height
-
-        if not swap:
-            inner_w, inner_h, inner_off = txt_w, txt_h, node.note_txt_offset
-            outer_w, outer_h, outer_off = img_w, img_h, node.note_img_offset
-            inner_scale = info.txt_scale
-            outer_scale = info.img_scale
-        else:
-            inner_w, inner_h, inner_off = img_w, img_h, node.note_img_offset
-            outer_w, outer_h, outer_off = txt_w, txt_h, node.note_txt_offset
-            inner_scale = info.img_scale
-            outer_scale = info.txt_scale
-
-        inner_x, inner_y = _calc_note_pos(info, alignment, inner_off, inner_w, inner_h, inner_scale)
-        offset_x_scaled, offset_y_scaled = outer_off[0] * outer_scale, outer_off[1] * outer_scale
-
-        if alignment == 'TOP':
-            outer_x, outer_y = inner_x + offset_x_scaled, inner_y + inner_h + offset_y_scaled
-        elif alignment == 'BOTTOM':
-            outer_x, outer_y = inner_x + offset_x_scaled, inner_y - outer_h + offset_y_scaled
-        elif alignment == 'LEFT':
-            outer_x, outer_y = inner_x - outer_w + offset_x_scaled, info.top_y - outer_h + offset_y_scaled
-        else:
-            outer_x, outer_y = inner_x + inner_w + offset_x_scaled, info.top_y - outer_h + offset_y_scaled
-
-        if not swap:
-            info.txt_x, info.txt_y = inner_x, inner_y
-            info.img_x, info.img_y = outer_x, outer_y
-        else:
-            info.txt_x, info.txt_y = outer_x, outer_y
-            info.img_x, info.img_y = inner_x, inner_y
-
-    def _set_non_stacked_position(info: TextImgInfo, scale: float) -> None:
-        """计算非堆叠情况下的元素位置"""
-        node = info.node
-        txt_x = txt_y = img_x = img_y = 0.0
-        if info.txt_should_draw:
-            txt_x, txt_y = _calc_note_pos(info, node.note_txt_pos, node.note_txt_offset,
-                                        info.txt_width, info.txt_height, info.txt_scale)
-        if info.img_should_draw:
-            img_x, img_y = _calc_note_pos(info, node.note_img_pos, node.note_img_offset,
-                                        info.img_width, info.img_height, info.img_scale)
-        info.txt_x, info.txt_y = txt_x, txt_y
-        info.img_x, info.img_y = img_x, img_y
-
-    def _set_center_align(info: TextImgInfo) -> None:
-        """应用居中偏移(仅对TOP/BOTTOM对齐有效)"""
-        node = info.node
-        node_width = info.right_x - info.left_x
-        if info.txt_should_draw and node.note_txt_center and node.note_txt_pos in {'TOP', 'BOTTOM'}:
-            info.txt_x += (node_width - info.txt_width) / 2
-        if info.img_should_draw and node.note_img_center and node.note_img_pos in {'TOP', 'BOTTOM'}:
-            info.img_x += (node_width - info.img_width) / 2
-
-    node = info.node
-    is_stacked = (node.note_txt_pos == node.note_img_pos)
-    if is_stacked:
-        _set_stacked_position(info, scale, node.note_txt_pos)
-    else:
-        _set_non_stacked_position(info, scale)
-    _set_center_align(info)
+    text_block = node.note_text_block
+    txt_width_mode = node.note_txt_width_mode
+    return NoteRecord(
+        text=display_text(node, text_block.as_string() if text_block else node.note_text),
+        is_document=text_block is not None,
+        show_txt=bool(snap.show_txt[i]),
+        font_size=int(snap.font_size[i]),
+        txt_width_mode=txt_width_mode,
+        txt_bg_width=int(snap.txt_bg_width[i]),
+        node_width=float(snap.width[i]),
+        txt_pos=node.note_txt_pos,
+        txt_center=bool(snap.txt_center[i]),
+        txt_offset=tuple(snap.txt_offset[i].tolist()),
+        depth=int(hierarchy.depths[i]) if txt_width_mode == 'KEEP' else 0,
+        image_size=tuple(img.size) if img else None,
+        show_img=bool(snap.show_img[i]),
+        img_width_mode=node.note_img_width_mode,
+        img_width=int(snap.img_width[i]),
+        img_pos=node.note_img_pos,
+        img_center=bool(snap.img_center[i]),
+        img_offset=tuple(snap.img_offset[i].tolist()),
+        swap_order=bool(snap.swap_order[i]),
+    )
 
 # region 核心绘制函数
 
-def _draw_text_note(info: TextImgInfo, scale: float, bg_color: RGBA) -> None:
+def _draw_text_note(info: NoteLayout, bg_color: RGBA, text_color: RGBA, params: DrawParams) -> None:
     """绘制文本+背景"""
     pad = PaddingX * info.txt_scale
     font_id = get_font_id()
     txt_x, txt_y = info.txt_x, info.txt_y
 
-    draw_rounded_rect_batch(txt_x, txt_y, info.txt_width, info.txt_height, bg_color, CornerRadius * info.txt_scale * 6 * pref().bg_rect_roundness)
+    draw_rounded_rect_batch(txt_x, txt_y, info.txt_width, info.txt_height, bg_color, CornerRadius * info.txt_scale * 6 * params.settings.bg_rect_roundness)
 
-    blf.color(font_id, *info.node.note_text_color)
+    blf.color(font_id, *text_color)
     blf.disable(font_id, blf.SHADOW)
     blf.size(font_id, info.txt_font_size)
     line_y = txt_y + pad
-    line_height = info.txt_font_size * 1.3
-    for i, line in enumerate(reversed(info.txt_lines)):  # type: ignore
-        blf.position(font_id, int(txt_x + pad), int(line_y + i*line_height + info.txt_font_size*0.25), 0)
-        blf.draw(font_id, line) # type: ignore
-
-def _draw_image_note(info: TextImgInfo) -> None:
-    if info.img_texture:
-        draw_texture_batch(info)
+    line_height = info.txt_font_size * LineHeight
+    lines: tuple[str, ...] = info.txt_lines  # type: ignore
+    # 只绘制区域内可见的行, 长文本笔记大部分行在屏幕外
+    start, end = visible_line_range(len(lines), line_y, line_height, params.region_height)
+    if info.txt_runs is None:
+        for i in range(start, end):
+            blf.position(font_id, int(txt_x + pad), int(line_y + i*line_height + info.txt_font_size*0.25), 0)
+            blf.draw(font_id, lines[-1 - i])
+        return
+
+    # 富文本: 逐段设置颜色, 粗体用偏移 1 像素的二次绘制模拟
+    bold_offset = max(1, round(info.txt_font_size / 16))
+    for i in range(start, end):
+        y = int(line_y + i*line_height + info.txt_font_size*0.25)
+        for run in info.txt_runs[-1 - i]:
+            x = txt_x + pad + run.x * info.txt_run_scale
+            blf.color(font_id, *(run.color or text_color))
+            blf.position(font_id, int(x), y, 0)
+            blf.draw(font_id, run.text)
+            if run.bold:
+                blf.position(font_id, int(x) + bold_offset, y, 0)
+                blf.draw(font_id, run.text)
+
+def _draw_image_note(info: NoteLayout, image: Image) -> None:
+    texture = get_gpu_texture(image) if image.size[0] > 0 else None
+    if texture:
+        draw_texture_batch(info, texture)
     else:
         draw_image_error_placeholder(info)
 
-def _collect_badge_coords(info: TextImgInfo, badge_infos: dict[int, list[BadgeInfo]]) -> None:
+def _collect_badge_coords(info: NoteLayout, badge_idx: int, badge_color: RGBA, badge_infos: dict[int, list[BadgeInfo]]) -> None:
     """收集序号坐标"""
     badge_pos = (info.left_x, info.top_y)
-    badge_idx = info.node.note_badge_index
     if badge_idx not in badge_infos:
         badge_infos[badge_idx] = []
-    badge_infos[badge_idx].append(BadgeInfo(badge_pos, info.node.note_badge_color))
+    badge_infos[badge_idx].append(BadgeInfo(badge_pos, badge_color))
 
 def _draw_badge_notes(badge_infos: dict[int, list[BadgeInfo]], params: DrawParams) -> None:
     def _draw_badge_lines(badge_infos: dict[int, list[BadgeInfo]], params: DrawParams) -> None:
         """绘制序号连线"""
-        if not pref().show_badge_lines or len(badge_infos) < 2: return
+        if not params.settings.show_badge_lines or len(badge_infos) < 2: return
         line_points: list[float2] = []
         indices = sorted(badge_infos.keys())
 
@@ -619,15 +469,15 @@ def _draw_badge_notes(badge_infos: dict[int, list[BadgeInfo]], params: DrawParam
                 for badge2 in badge_infos[indices[i+1]]:
                     line_points.append(badge1.pos)
                     line_points.append(badge2.pos)
-                    draw_arrow_head(badge1.pos, badge2.pos, params.arrow_size, params.badge_radius)
+                    draw_arrow_head(badge1.pos, badge2.pos, params.arrow_size, params.badge_radius, params.settings.badge_line_color)
 
-        draw_lines_batch(line_points, pref().badge_line_thickness)
+        draw_lines_batch(line_points, params.settings.badge_line_thickness, params.settings.badge_line_color)
 
     def _draw_badge_badges(badge_infos: dict[int, list[BadgeInfo]], params: DrawParams) -> None:
         """绘制序号徽章(背景+文本)"""
         font_id = 0
         blf.size(font_id, params.badge_font_size)
-        blf.color(font_id, *pref().badge_font_color)
+        blf.color(font_id, *params.settings.badge_font_color)
         for i in badge_infos:
             for badge in badge_infos[i]:
                 # 绘制背景圆
@@ -643,68 +493,155 @@ def _draw_badge_notes(badge_infos: dict[int, list[BadgeInfo]], params: DrawParam
     _draw_badge_lines(badge_infos, params)
     _draw_badge_badges(badge_infos, params)
 
-def _process_and_draw_text_and_image_note(node: NotedNode, params: DrawParams, badge_infos: dict[int, list[BadgeInfo]]) -> None:
+def _get_note_layout(node: NotedNode, snap: NodeSnapshot, hierarchy: NodeHierarchy, i: int, rect: tuple[float, float, float, float],
+                     is_visible: bool, params: DrawParams, cache: RegionCache) -> NoteLayout:
+    """节点没有改动且矩形不变时复用上一帧的排版"""
+    uid = snap.uuids[i]
+    cached = cache.notes.get(uid)
+    if (cached is not None and cached.cacheable and cached.rect == rect and cached.is_visible == is_visible
+            and not dirty.is_dirty(cache.tree_ptr, uid, cached.stamp)):
+        return cached.layout
+    stamp = dirty.current_stamp()
+    info = layout_note(note_record(node, snap, hierarchy, i), rect, params.layout, get_font_metrics(), is_visible)
+    cache.notes[uid] = CachedNote(stamp, rect, is_visible, info, node.note_text_block is None)
+    return info
+
+def _process_and_draw_text_and_image_note(node: NotedNode, snap: NodeSnapshot, hierarchy: NodeHierarchy, i: int,
+                                          rect: np.ndarray, is_visible: bool, params: DrawParams, cache: RegionCache, badge_infos: dict[int, list[BadgeInfo]],
+                                          hits: HitIndex) -> None:
     """处理单个节点的注释绘制"""
     # 早期返回检查
-    text, img, badge_idx = node.note_text, node.note_image, node.note_badge_index
-    show_txt, show_img, show_badge = node.note_show_txt, node.note_show_img, node.note_show_badge
+    badge_idx = int(snap.badge_index[i])
+    show_txt, show_img, show_badge = snap.show_txt[i], snap.show_img[i], snap.show_badge[i]
+    has_badge = badge_idx > 0 and show_badge
+    text = show_txt and (node.note_text or node.note_text_block)
+    img = node.note_image if show_img else None
 
-    if not (text and show_txt) and not (img and show_img) and not (badge_idx > 0 and show_badge):
+    if not text and not img and not has_badge:
         return
 
-    bg_color = node.note_txt_bg_color
-    is_visible = check_color_visibility(bg_color)
-    if pref().hide_img_by_bg and not is_visible and badge_idx == 0:
+    if params.settings.hide_img_by_bg and not is_visible and badge_idx == 0:
         return
 
     # 计算尺寸和位置
-    scale = params.scale
-    info = _get_node_info(node)
-    _set_text_note_info(info, scale, is_visible)
-    _set_image_note_info(info, scale)
-    _set_note_position(info, scale)
+    info = _get_note_layout(node, snap, hierarchy, i, tuple(rect.tolist()), is_visible, params, cache)
 
+    uid = snap.uuids[i]
     if info.img_should_draw:
-        _draw_image_note(info)
+        _draw_image_note(info, node.note_image)
+        hits.add(uid, "IMG", info.img_x, info.img_y, info.img_width, info.img_height, info.img_scale)
     if info.txt_should_draw:
-        _draw_text_note(info, scale, bg_color)
-    if badge_idx > 0 and show_badge:
-        _collect_badge_coords(info, badge_infos)
+        _draw_text_note(info, tuple(snap.txt_bg_color[i].tolist()), tuple(snap.text_color[i].tolist()), params)
+        hits.add(uid, "TXT", info.txt_x, info.txt_y, info.txt_width, info.txt_height, info.txt_scale)
+    if has_badge:
+        _collect_badge_coords(info, badge_idx, tuple(snap.badge_color[i].tolist()), badge_infos)
+
+def _draw_group_rollup(rollup: NoteRollup, rect: tuple[float, float, float, float], region_width: float, params: DrawParams) -> None:
+    """在组节点右上角上方绘制内部笔记汇总: 分类色点 + 笔记数 + 置顶笔记首行"""
+    font_id = get_font_id()
+    font_size = params.badge_font_size
+    blf.size(font_id, font_size)
+    label = f"{rollup.count}  {rollup.pinned}" if rollup.pinned else str(rollup.count)
+    text_width = blf.dimensions(font_id, label)[0]
+    categories = rollup.top_categories(RollupCategories)
+    pad = font_size * 0.5
+    dot_radius = font_size * 0.3
+    dot_step = dot_radius * 2.5
+    width = pad * 2 + len(categories) * dot_step + text_width
+    height = font_size * 1.5
+    x = rect[2] - width
+    y = rect[1] + font_size * 0.3
+    if x > region_width or y > params.region_height or x + width < 0 or y + height < 0: return
+    draw_rounded_rect_batch(x, y, width, height, RollupBg, height / 2)
+    dot_x = x + pad + dot_radius
+    for category in categories:
+        draw_circle_batch((dot_x, y + height / 2), dot_radius, params.settings.category_color(category))
+        dot_x += dot_step
+    blf.color(font_id, *params.settings.badge_font_color)
+    blf.position(font_id, int(x + pad + len(categories) * dot_step), int(y + height / 2 - font_size * 0.35), 0)
+    blf.draw(font_id, label)
+
+def _draw_group_rollups(rollups: list[tuple[int, NoteRollup]], rects: np.ndarray, params: DrawParams) -> None:
+    """只绘制上次计算的汇总, 不扫描组节点也不遍历嵌套节点树"""
+    region_width = bpy.context.region.width
+    for index, rollup in rollups:
+        _draw_group_rollup(rollup, tuple(rects[index].tolist()), region_width, params)
 
 # region 主入口和注册函数
 
 def draw_callback_px() -> None:
     """主绘制回调函数"""
     space: SpaceNodeEditor = bpy.context.space_data
-    if space.type != 'NODE_EDITOR' or not pref().show_all_notes: return
-    if pref().dependent_overlay and not space.overlay.show_overlays: return
+    settings = get_draw_settings()
+    if space.type != 'NODE_EDITOR': return
+    # 没有绘制笔记的帧也要清空命中索引, 隐藏的笔记不能被点中
+    region = bpy.context.region
     tree: NodeTree = space.edit_tree
+    hits = hit_index.begin_frame(region.as_pointer(), tree.as_pointer() if tree else 0, region.width, region.height)
+    if not settings.show_all_notes: return
+    if settings.dependent_overlay and not space.overlay.show_overlays: return
     if not tree: return
 
-    active = tree.nodes.active
-    params = _get_draw_params()
+    # 只处理登记表中有笔记的节点
+    noted = noted_indices(tree)
+    rollups = group_rollups(tree.as_pointer()) if settings.show_group_rollups else []
+    if not noted and not rollups: return
+    nodes = tree.nodes
+    params = _get_draw_params(settings)
     badge_infos: dict[int, list[BadgeInfo]] = {}
-    nodes_to_draw: list[NotedNode] = []
-
-    if pref().show_selected_only:
-        nodes_to_draw = bpy.context.selected_nodes # type: ignore
-    else:
-        nodes_to_draw = tree.nodes # type: ignore
 
-    for node in nodes_to_draw:
-        if node == active: continue
-        _process_and_draw_text_and_image_note(node, params, badge_infos)
-    if active:
-        _process_and_draw_text_and_image_note(active, params, badge_infos)  # type: ignore
+    snap = take_snapshot(nodes, noted)
+    mask = np.zeros(snap.count, dtype=bool)
+    mask[noted] = True
+    mask &= snap.note_mask()
+    # 活动节点最后绘制, 显示在最上层
+    active_idx = nodes.find(nodes.active.name) if nodes.active else -1
+    if active_idx >= 0 and not mask[active_idx]:
+        active_idx = -1
+    if settings.show_selected_only:
+        mask &= snap.select
+    if active_idx >= 0:
+        mask[active_idx] = False
+
+    indices = np.flatnonzero(mask).tolist()
+    if active_idx >= 0:
+        indices.append(active_idx)
+    group_rows = [(index, rollup) for name, rollup in rollups if (index := nodes.find(name)) >= 0]
+    # 只解析要绘制的节点的父级链
+    hierarchy = NodeHierarchy(nodes, snap, indices + [index for index, _ in group_rows])
+    rects = _get_node_rects(snap, hierarchy.locations, params.view)
+    visible = settings.visible_mask(snap.category)
+    cache = _get_region_cache(tree, params)
+    noted_nodes = [nodes[i] for i in indices]
+    dirty.watch_nodes(tree, noted_nodes)  # type: ignore
+    for i, node in zip(indices, noted_nodes):
+        _process_and_draw_text_and_image_note(node, snap, hierarchy, i, rects[i], bool(visible[i]), params, cache, badge_infos, hits)  # type: ignore
     _draw_badge_notes(badge_infos, params)
+    if group_rows:
+        _draw_group_rollups(group_rows, rects, params)
+
+def _invalidate_images(depsgraph) -> int:
+    """图片重新加载/编辑后丢弃对应的手动纹理"""
+    if not _manual_texture_cache: return 0
+    count = 0
+    for update in depsgraph.updates:
+        if isinstance(update.id, Image) and _manual_texture_cache.pop(update.id.original.as_pointer(), None) is not None:
+            count += 1
+    return count
 
 def register_draw_handler() -> None:
     global handler
     if not handler:
         handler = SpaceNodeEditor.draw_handler_add(draw_callback_px, (), 'WINDOW', 'POST_PIXEL')  # type: ignore
+    cache_manager.register_cache("textures", _manual_texture_cache.clear, _invalidate_images)
+    cache_manager.register_cache("region_layouts", _region_caches.clear)
+    cache_manager.register_cache("hit_index", hit_index.clear_hits)
 
 def unregister_draw_handler() -> None:
     global handler
     if handler:
         SpaceNodeEditor.draw_handler_remove(handler, 'WINDOW')
         handler = None
+    cache_manager.unregister_cache("hit_index")
+    cache_manager.unregister_cache("region_layouts")
+    cache_manager.unregister_cache("textures")
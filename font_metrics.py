@@ -0,0 +1,127 @@
+import bpy
+import blf
+import json
+import os
+import hashlib
+import numpy as np
+
+# 字形宽度缓存: 内存表按 (字体ID, 字号) 索引; 自定义字体文件的测量结果持久化到磁盘, 跨会话复用
+
+CacheFileName = "font_metrics.json"
+MaxSizesPerFont = 48
+SaveDelay = 10.0
+
+_glyph_advances: dict[tuple[int, int], dict[str, float]] = {}
+_disk_cache: dict[str, dict[str, dict[str, float]]] | None = None
+"""字体文件标识 -> 字号 -> 字符 -> 宽度"""
+_disk_dirty = False
+
+def _cache_file_path() -> str:
+    return os.path.join(bpy.utils.extension_path_user(__package__, create=True), CacheFileName)  # type: ignore
+
+def font_file_key(font_path: str) -> str:
+    """字体文件标识: 绝对路径 + 文件大小/修改时间哈希, 字体文件变化后自动失效"""
+    abs_path = os.path.abspath(font_path)
+    stat = os.stat(abs_path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+    return f"{abs_path}|{digest}"
+
+def _load_disk_cache() -> dict[str, dict[str, dict[str, float]]]:
+    """首次使用自定义字体时才读取磁盘缓存"""
+    global _disk_cache
+    if _disk_cache is None:
+        _disk_cache = {}
+        try:
+            with open(_cache_file_path(), encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                _disk_cache = data
+        except (OSError, ValueError):
+            pass
+    return _disk_cache
+
+def _persistent_table(font_path: str, font_size: int) -> dict[str, float] | None:
+    try:
+        key = font_file_key(font_path)
+    except OSError:
+        return None
+    disk_cache = _load_disk_cache()
+    sizes = disk_cache.get(key)
+    if sizes is None:
+        # 同一路径的旧版本字体记录已失效
+        prefix = key.split("|")[0] + "|"
+        for stale in [k for k in disk_cache if k.startswith(prefix)]:
+            del disk_cache[stale]
+        sizes = disk_cache[key] = {}
+    table = sizes.get(str(font_size))
+    if table is None:
+        table = sizes[str(font_size)] = {}
+    return table
+
+def _schedule_save() -> None:
+    global _disk_dirty
+    if _disk_dirty: return
+    _disk_dirty = True
+    if not bpy.app.timers.is_registered(save_font_cache):
+        bpy.app.timers.register(save_font_cache, first_interval=SaveDelay, persistent=True)
+
+def save_font_cache() -> None:
+    """将新测量的字形宽度写入磁盘"""
+    global _disk_dirty
+    if not _disk_dirty or _disk_cache is None: return
+    _disk_dirty = False
+    for sizes in _disk_cache.values():
+        while len(sizes) > MaxSizesPerFont:
+            del sizes[next(iter(sizes))]
+    try:
+        path = _cache_file_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_disk_cache, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except (OSError, ValueError) as e:
+        print(f"Node Note: cannot save font metrics cache: {e}")
+
+def get_advances(font_id: int, font_path: str, font_size: int, text: str) -> np.ndarray:
+    """按 (字体, 字号) 缓存的逐字符宽度表, 缺失的字符才调用 blf 测量"""
+    table = _glyph_advances.get((font_id, font_size))
+    if table is None:
+        table = _persistent_table(font_path, font_size) if font_path else None
+        if table is None:
+            table = {}
+        _glyph_advances[(font_id, font_size)] = table
+    missing = set(text).difference(table)
+    if missing:
+        blf.size(font_id, font_size)
+        for char in missing:
+            table[char] = blf.dimensions(font_id, char)[0]
+        if font_path:
+            _schedule_save()
+    return np.fromiter((table[char] for char in text), dtype=np.float64, count=len(text))
+
+class BlfMetrics:
+    """基于 blf 的字体度量, 实现 layout.FontMetrics 接口"""
+    def __init__(self, font_id: int, font_path: str = ""):
+        self.font_id = font_id
+        self.font_path = font_path
+        """ 自定义字体文件路径, 默认字体为空 """
+
+    @property
+    def key(self) -> tuple[str, int, str]:
+        return ("blf", self.font_id, self.font_path)
+
+    def advances(self, text: str, font_size: int) -> np.ndarray:
+        return get_advances(self.font_id, self.font_path, font_size, text)
+
+    def line_width(self, text: str, font_size: int) -> float:
+        blf.size(self.font_id, font_size)
+        return blf.dimensions(self.font_id, text)[0]
+
+def clear_font_metrics() -> None:
+    _glyph_advances.clear()
+
+def unregister() -> None:
+    if bpy.app.timers.is_registered(save_font_cache):
+        bpy.app.timers.unregister(save_font_cache)
+    save_font_cache()
+    clear_font_metrics()
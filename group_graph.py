@@ -0,0 +1,98 @@
+from collections import deque
+from dataclasses import dataclass, field
+from bpy.types import Depsgraph, NodeTree, SpaceNodeEditor
+from .utils import iter_node_trees
+from . import cache_manager
+
+# 节点组嵌套关系图: 节点树 -> 其中的组节点及其引用的节点树
+# 每棵树的出边按需扫描一次后缓存, 依赖图报告该树更新或节点数变化时才重新扫描
+# 导航时从编辑器当前路径上最深的、能到达目标的节点树出发, 广度优先求出要依次进入的组节点
+
+@dataclass
+class TreeEdges:
+    node_count: int
+    children: list[tuple[str, int]] = field(default_factory=list)
+    """ (组节点名, 引用的节点树指针) """
+
+_edges: dict[int, TreeEdges] = {}
+""" 节点树指针 -> 出边 """
+_version = 0
+""" 任意节点树的出边重新扫描或失效时加一 """
+
+def graph_version() -> int:
+    return _version
+
+def group_children(tree: NodeTree) -> list[tuple[str, int]]:
+    """节点树中的组节点(缓存)"""
+    global _version
+    tree_ptr = tree.as_pointer()
+    entry = _edges.get(tree_ptr)
+    if entry is None or entry.node_count != len(tree.nodes):
+        _version += 1
+        children = [(node.name, node.node_tree.as_pointer()) for node in tree.nodes
+                    if node.type == 'GROUP' and getattr(node, "node_tree", None) is not None]
+        entry = _edges[tree_ptr] = TreeEdges(len(tree.nodes), children)
+    return entry.children
+
+def find_group_path(start: NodeTree, target_ptr: int, trees: dict[int, NodeTree]) -> list[tuple[str, NodeTree]] | None:
+    """从 start 进入 target 需要依次经过的 (组节点名, 节点树), 到达不了返回 None"""
+    start_ptr = start.as_pointer()
+    if start_ptr == target_ptr:
+        return []
+    previous: dict[int, tuple[int, str]] = {start_ptr: (0, "")}
+    queue = deque([start_ptr])
+    while queue:
+        tree_ptr = queue.popleft()
+        for name, child_ptr in group_children(trees[tree_ptr]):
+            if child_ptr in previous or child_ptr not in trees: continue
+            previous[child_ptr] = (tree_ptr, name)
+            if child_ptr == target_ptr:
+                path: list[tuple[str, NodeTree]] = []
+                while child_ptr != start_ptr:
+                    parent_ptr, group_name = previous[child_ptr]
+                    path.append((group_name, trees[child_ptr]))
+                    child_ptr = parent_ptr
+                path.reverse()
+                return path
+            queue.append(child_ptr)
+    return None
+
+def enter_tree(space: SpaceNodeEditor, target: NodeTree) -> bool:
+    """调整编辑器路径进入 target, 优先从当前路径中最深的祖先进入; 无法到达返回 False"""
+    trees = {tree.as_pointer(): tree for tree in iter_node_trees()}
+    target_ptr = target.as_pointer()
+    path = space.path
+    for depth in range(len(path) - 1, -1, -1):
+        start = path[depth].node_tree
+        steps = find_group_path(start, target_ptr, trees)
+        if steps is None: continue
+        for _ in range(len(path) - 1 - depth):
+            path.pop()
+        parent = start
+        for group_name, child in steps:
+            path.append(child, node=parent.nodes[group_name])
+            parent = child
+        return True
+    return False
+
+def _on_depsgraph_update(depsgraph: Depsgraph) -> int:
+    global _version
+    if not _edges: return 0
+    count = 0
+    for update in depsgraph.updates:
+        if isinstance(update.id, NodeTree) and _edges.pop(update.id.original.as_pointer(), None) is not None:
+            count += 1
+    if count:
+        _version += 1
+    return count
+
+def clear_group_graph() -> None:
+    global _version
+    _edges.clear()
+    _version += 1
+
+def register() -> None:
+    cache_manager.register_cache("group_graph", clear_group_graph, _on_depsgraph_update)
+
+def unregister() -> None:
+    cache_manager.unregister_cache("group_graph")
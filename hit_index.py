@@ -0,0 +1,62 @@
+from dataclasses import dataclass, field
+from typing import Literal
+
+# 绘制时顺带记录每个笔记在屏幕上的矩形, 供点击/拖动笔记时做命中测试
+# 按固定大小的网格分桶, 查询只检查光标所在格子里的矩形; 后绘制的在上层, 重叠时优先命中
+
+CellSize = 128
+""" 网格边长(屏幕像素) """
+
+HitKind = Literal["TXT", "IMG"]
+
+@dataclass(frozen=True)
+class NoteHit:
+    tree_ptr: int
+    uid: str
+    kind: HitKind
+    rect: tuple[float, float, float, float]
+    """ 屏幕空间 (左, 下, 右, 上) """
+    scale: float
+    """ 偏移量一个单位对应的屏幕像素 """
+
+@dataclass
+class HitIndex:
+    tree_ptr: int
+    width: int
+    height: int
+    """ 区域尺寸, 超出区域的部分不分桶 """
+    hits: list[NoteHit] = field(default_factory=list)
+    cells: dict[tuple[int, int], list[int]] = field(default_factory=dict)
+
+    def add(self, uid: str, kind: HitKind, x: float, y: float, width: float, height: float, scale: float) -> None:
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.width), min(y + height, self.height)
+        if x1 <= x0 or y1 <= y0: return
+        hit_id = len(self.hits)
+        self.hits.append(NoteHit(self.tree_ptr, uid, kind, (x, y, x + width, y + height), scale))
+        for cx in range(int(x0 // CellSize), int(x1 // CellSize) + 1):
+            for cy in range(int(y0 // CellSize), int(y1 // CellSize) + 1):
+                self.cells.setdefault((cx, cy), []).append(hit_id)
+
+    def query(self, x: float, y: float) -> NoteHit | None:
+        for hit_id in reversed(self.cells.get((int(x // CellSize), int(y // CellSize)), ())):
+            hit = self.hits[hit_id]
+            left, bottom, right, top = hit.rect
+            if left <= x <= right and bottom <= y <= top:
+                return hit
+        return None
+
+_region_hits: dict[int, HitIndex] = {}
+""" 区域指针 -> 最近一帧的命中索引 """
+
+def begin_frame(region_ptr: int, tree_ptr: int, width: int, height: int) -> HitIndex:
+    """每帧绘制开始时替换该区域的索引"""
+    index = _region_hits[region_ptr] = HitIndex(tree_ptr, width, height)
+    return index
+
+def hit_test(region_ptr: int, x: float, y: float) -> NoteHit | None:
+    index = _region_hits.get(region_ptr)
+    return index.query(x, y) if index is not None else None
+
+def clear_hits() -> None:
+    _region_hits.clear()
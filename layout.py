@@ -0,0 +1,592 @@
+"""笔记排版核心: 纯 Python/NumPy 实现, 不依赖 bpy/blf, 可在 Blender 之外测试和性能分析"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Literal, Protocol
+import math
+import re
+import numpy as np
+
+float2 = tuple[float, float]
+int2 = tuple[int, int]
+RGBA = tuple[float, float, float, float]
+AlignMode = Literal["TOP", "BOTTOM", "LEFT", "RIGHT"]
+TextWidthMode = Literal["AUTO", "FIT", "MANUAL", "KEEP"]
+ImageWidthMode = Literal["AUTO", "ORIGINAL", "MANUAL", "KEEP"]
+
+# region 常量
+
+PaddingX = 2
+MinAutoWidth = 101
+LineHeight = 1.3
+Margin = 2
+KeepDepthFactor = 0.75  # todo 如果需要,可以偏好设置自定义
+ZoomBucketStep = 1.1
+""" 缩放量化步长(对数), 同一档内复用换行结果 """
+BulletPrefixes = ("- ", "* ")
+Bullet = "• "
+MarkupColors: dict[str, RGBA] = {
+    "red": (1.0, 0.35, 0.35, 1.0),
+    "green": (0.45, 0.9, 0.45, 1.0),
+    "blue": (0.45, 0.65, 1.0, 1.0),
+    "orange": (1.0, 0.65, 0.25, 1.0),
+    "purple": (0.8, 0.5, 1.0, 1.0),
+    "yellow": (1.0, 0.9, 0.3, 1.0),
+    "white": (1.0, 1.0, 1.0, 1.0),
+    "gray": (0.6, 0.6, 0.6, 1.0),
+}
+
+# region 字体度量
+
+class FontMetrics(Protocol):
+    """字体度量接口, blf 实现见 font_metrics.BlfMetrics"""
+    @property
+    def key(self) -> Hashable:
+        """字体标识, 用作排版缓存键的一部分"""
+        ...
+
+    def advances(self, text: str, font_size: int) -> np.ndarray:
+        """逐字符宽度"""
+        ...
+
+    def line_width(self, text: str, font_size: int) -> float:
+        """整行宽度"""
+        ...
+
+class FixedWidthMetrics:
+    """等宽字体度量桩, 宽字符(CJK等)按两倍宽度计, 用于无 GPU 环境下的测试和性能分析"""
+    def __init__(self, char_width: float = 0.5, wide_char_width: float = 1.0):
+        self.char_width = char_width
+        self.wide_char_width = wide_char_width
+
+    @property
+    def key(self) -> Hashable:
+        return ("fixed", self.char_width, self.wide_char_width)
+
+    def advances(self, text: str, font_size: int) -> np.ndarray:
+        codes = np.fromiter(map(ord, text), dtype=np.int64, count=len(text))
+        return np.where(codes >= 0x2E80, self.wide_char_width, self.char_width) * font_size
+
+    def line_width(self, text: str, font_size: int) -> float:
+        return float(self.advances(text, font_size).sum())
+
+# region 缓存
+
+class LRUCache:
+    """带容量上限和命中统计的 LRU 缓存"""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+text_layout_cache = LRUCache(1024)
+markup_cache = LRUCache(512)
+""" 富文本解析结果, 按文本缓存 """
+paragraph_cache = LRUCache(8192)
+""" 段落级换行缓存, 长文本编辑时只有改动的段落需要重新换行 """
+
+# region 数据类
+
+@dataclass(frozen=True)
+class TextSpan:
+    """富文本样式区间, 下标基于去除标记后的段落文本"""
+    start: int
+    end: int
+    bold: bool
+    color: RGBA | None
+
+@dataclass(frozen=True)
+class TextRun:
+    """一行中样式相同的一段文本"""
+    text: str
+    x: float
+    """ 相对行首的偏移, 排版字号下的像素 """
+    bold: bool
+    color: RGBA | None
+
+@dataclass(frozen=True)
+class TextLayout:
+    """换行排版结果, 相同文本和参数的节点共享同一份"""
+    lines: tuple[str, ...]
+    max_line_width: float
+    height: float
+    """ 行高之和, 不含内边距 """
+    runs: tuple[tuple[TextRun, ...], ...] | None = None
+    """ 逐行样式片段, 纯文本为 None """
+
+@dataclass
+class NoteRecord:
+    """排版所需的笔记数据, 与 bpy.types.Node 解耦"""
+    text: str = ""
+    show_txt: bool = True
+    font_size: int = 8
+    txt_width_mode: TextWidthMode = 'AUTO'
+    txt_bg_width: int = 200
+    node_width: float = 140
+    """ 节点宽度(编辑器坐标) """
+    txt_pos: AlignMode = 'TOP'
+    txt_center: bool = False
+    txt_offset: int2 = (0, 0)
+    is_document: bool = False
+    """ 正文来自文本数据块, 按真实换行分段, 不使用分隔符 """
+    depth: int = 0
+    """ 节点所在框的嵌套层级 """
+
+    image_size: int2 | None = None
+    """ 图像像素尺寸, 无图像时为 None """
+    show_img: bool = True
+    img_width_mode: ImageWidthMode = 'AUTO'
+    img_width: int = 300
+    img_pos: AlignMode = 'TOP'
+    img_center: bool = True
+    img_offset: int2 = (0, 0)
+    swap_order: bool = False
+
+@dataclass
+class NoteLayout:
+    """文本和图像的尺寸与位置 屏幕空间 信息"""
+    top_y: float = 0
+    bottom_y: float = 0
+    left_x: float = 0
+    right_x: float = 0
+
+    txt_width: float = 0
+    """ 文本背景宽度 """
+    txt_height: float = 0
+    """ 文本背景高度 """
+    txt_lines: tuple[str, ...] | None = None
+    """ 换行后的文本内容 """
+    txt_runs: tuple[tuple[TextRun, ...], ...] | None = None
+    """ 富文本逐行样式片段 """
+    txt_run_scale: float = 1.0
+    """ 绘制字号 / 排版字号, 用于换算片段偏移 """
+    txt_font_size: int = 0
+
+    img_width: float = 0
+    img_height: float = 0
+
+    txt_x: float = 0
+    """ 文本注释左上角X """
+    txt_y: float = 0
+    img_x: float = 0
+    """ 图像注释左上角X """
+    img_y: float = 0
+    txt_should_draw: bool = False
+    img_should_draw: bool = False
+
+    txt_scale: float = 1.0
+    img_scale: float = 1.0
+
+@dataclass
+class LayoutParams:
+    """每帧共享的排版参数"""
+    scale: float
+    """ 编辑器缩放 * 界面缩放 """
+    ui_scale: float
+    view_scale: float
+    """ 节点编辑器坐标一个单位对应的屏幕像素 """
+    separator: str = ""
+    markup: bool = False
+    """ 是否解析富文本标记 """
+
+# region 文本
+
+def split_lines(text: str, separator: str) -> list[str]:
+    """使用分隔符将文本转换为换行, 支持多个(用 | 分隔)"""
+    if not separator:
+        return text.splitlines()
+    for sep in separator.split('|'):
+        text = text.replace(sep, "\n")
+    return text.splitlines()
+
+def wrap_paragraph(metrics: FontMetrics, font_size: int, para: str, max_width: float) -> list[str]:
+    """按宽度逐字符换行单个段落"""
+    if not para:
+        return [""]
+    lines: list[str] = []
+    # 累计宽度 + 二分查找断行位置, 每行至少放一个字符
+    cum_widths = np.cumsum(metrics.advances(para, font_size))
+    start, count = 0, len(para)
+    while start < count:
+        base = cum_widths[start - 1] if start else 0.0
+        end = int(np.searchsorted(cum_widths, base + max_width, side='right'))
+        end = max(end, start + 1)
+        lines.append(para[start:end])
+        start = end
+    return lines
+
+def _layout_paragraph(metrics: FontMetrics, para: str, font_size: int, wrap_width: float) -> tuple[tuple[str, ...], float]:
+    """段落换行和最大行宽, 按段落内容缓存; wrap_width 为 0 时不换行"""
+    key = (metrics.key, para, font_size, wrap_width)
+    result: tuple[tuple[str, ...], float] | None = paragraph_cache.get(key)
+    if result is None:
+        lines = tuple(wrap_paragraph(metrics, font_size, para, wrap_width)) if wrap_width else (para,)
+        max_line_w = max(metrics.line_width(line, font_size) for line in lines)
+        result = (lines, max_line_w)
+        paragraph_cache.put(key, result)
+    return result
+
+# region 富文本
+
+_markup_pattern = re.compile(r"\*\*|\[/\]|\[(#[0-9a-fA-F]{6}|#[0-9a-fA-F]{3}|[a-z]+)\]")
+
+def _parse_color(name: str) -> RGBA | None:
+    if not name.startswith("#"):
+        return MarkupColors.get(name)
+    hex_digits = name[1:]
+    if len(hex_digits) == 3:
+        hex_digits = "".join(c * 2 for c in hex_digits)
+    r, g, b = (int(hex_digits[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    return (r, g, b, 1.0)
+
+def parse_markup(text: str, separator: str) -> tuple[tuple[str, tuple[TextSpan, ...]], ...] | None:
+    """解析 **粗体**, [red]颜色[/] / [#ff8800]颜色[/] 和行首 "- " 列表, 返回 (纯文本段落, 样式区间);
+    不含任何标记时返回 None. 样式可以跨段落延续"""
+    key = (text, separator)
+    cached = markup_cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    paragraphs: list[tuple[str, tuple[TextSpan, ...]]] = []
+    has_markup = False
+    bold = False
+    colors: list[RGBA] = []
+    for para in split_lines(text, separator):
+        parts: list[str] = []
+        spans: list[TextSpan] = []
+        length = 0
+
+        def emit(segment: str) -> None:
+            nonlocal length
+            if not segment: return
+            color = colors[-1] if colors else None
+            if bold or color:
+                spans.append(TextSpan(length, length + len(segment), bold, color))
+            parts.append(segment)
+            length += len(segment)
+
+        if para.startswith(BulletPrefixes):
+            has_markup = True
+            parts.append(Bullet)
+            length = len(Bullet)
+            para = para[len(BulletPrefixes[0]):]
+        pos = 0
+        for match in _markup_pattern.finditer(para):
+            token = match.group(0)
+            color = None
+            if token not in {"**", "[/]"}:
+                color = _parse_color(match.group(1))
+                if color is None:
+                    continue    # 未知标签按普通文本显示
+            emit(para[pos:match.start()])
+            pos = match.end()
+            has_markup = True
+            if token == "**":
+                bold = not bold
+            elif token == "[/]":
+                if colors: colors.pop()
+            else:
+                colors.append(color)  # type: ignore
+        emit(para[pos:])
+        paragraphs.append(("".join(parts), tuple(spans)))
+
+    result = tuple(paragraphs) if has_markup else ()
+    markup_cache.put(key, result)
+    return result or None
+
+def _line_runs(metrics: FontMetrics, font_size: int, line: str, line_start: int,
+               spans: tuple[TextSpan, ...]) -> tuple[TextRun, ...]:
+    """按样式区间切分一行, 并用字形宽度计算每段的行内偏移"""
+    line_end = line_start + len(line)
+    cuts = {0, len(line)}
+    for span in spans:
+        if span.end > line_start and span.start < line_end:
+            cuts.add(max(span.start, line_start) - line_start)
+            cuts.add(min(span.end, line_end) - line_start)
+    bounds = sorted(cuts)
+    offsets = np.concatenate(([0.0], np.cumsum(metrics.advances(line, font_size)))) if line else np.zeros(1)
+    runs: list[TextRun] = []
+    for start, end in zip(bounds, bounds[1:]):
+        pos = line_start + start
+        span = next((s for s in spans if s.start <= pos < s.end), None)
+        runs.append(TextRun(line[start:end], float(offsets[start]), bool(span and span.bold), span.color if span else None))
+    return tuple(runs)
+
+def get_text_layout(metrics: FontMetrics, text: str, separator: str, font_size: int, txt_width_mode: TextWidthMode,
+                    wrap_width: float, markup: bool = False) -> TextLayout:
+    """文本换行与尺寸测量, 结果按参数缓存(LRU)"""
+    key = (metrics.key, text, separator, font_size, txt_width_mode, wrap_width, markup)
+    layout: TextLayout | None = text_layout_cache.get(key)
+    if layout is not None:
+        return layout
+
+    if txt_width_mode in {'FIT', 'KEEP'}:
+        wrap_width = 0
+    else:
+        wrap_width = max(1, wrap_width)
+    styled = parse_markup(text, separator) if markup else None
+    if styled is None:
+        paragraphs = [(para, ()) for para in split_lines(text, separator)]
+    else:
+        paragraphs = styled
+
+    lines: list[str] = []
+    runs: list[tuple[TextRun, ...]] = []
+    max_line_w = 0.0
+    for para, spans in paragraphs:
+        para_lines, para_w = _layout_paragraph(metrics, para, font_size, wrap_width)
+        lines.extend(para_lines)
+        max_line_w = max(max_line_w, para_w)
+        if styled is not None:
+            line_start = 0
+            for line in para_lines:
+                runs.append(_line_runs(metrics, font_size, line, line_start, spans))
+                line_start += len(line)
+    height = len(lines) * font_size * LineHeight
+    layout = TextLayout(tuple(lines), max_line_w, height, tuple(runs) if styled is not None else None)
+    text_layout_cache.put(key, layout)
+    return layout
+
+def visible_line_range(line_count: int, first_line_y: float, line_height: float, region_height: float) -> tuple[int, int]:
+    """自下而上排列的行中, 落在区域 [0, region_height] 内的行序号范围 [start, end)"""
+    if line_count == 0 or line_height <= 0:
+        return 0, 0
+    start = max(0, math.floor(-first_line_y / line_height) - 1)
+    end = min(line_count, math.ceil((region_height - first_line_y) / line_height) + 1)
+    return start, max(start, end)
+
+def quantize_scale(scale: float) -> float:
+    """将连续缩放吸附到对数档位, 缩放在同一档内变化时不必重新换行"""
+    if scale <= 0:
+        return scale
+    return ZoomBucketStep ** round(math.log(scale, ZoomBucketStep))
+
+# region 位置
+
+def calc_note_pos(info: NoteLayout, alignment: AlignMode, offset_vec: float2, self_width: float, self_height: float,
+                  scale: float) -> float2:
+    """计算元素位置"""
+    base_x = info.left_x
+    base_y = info.top_y
+    bottom_y = info.bottom_y
+    right_x = info.right_x
+
+    offset_x = offset_vec[0] * scale
+    offset_y = offset_vec[1] * scale
+
+    if alignment == 'TOP':
+        pos_x = base_x
+        pos_y = base_y + Margin*scale
+    elif alignment == 'BOTTOM':
+        pos_x = base_x
+        pos_y = bottom_y - Margin*scale - self_height
+    elif alignment == 'LEFT':
+        pos_x = base_x - Margin*scale - self_width
+        pos_y = base_y - self_height
+    elif alignment == 'RIGHT':
+        pos_x = right_x + Margin*scale
+        pos_y = base_y - self_height
+
+    return pos_x + offset_x, pos_y + offset_y
+
+def _set_text_layout(info: NoteLayout, note: NoteRecord, params: LayoutParams, metrics: FontMetrics) -> None:
+    """设置文本注释的尺寸和换行信息"""
+    txt_width_mode = note.txt_width_mode
+    current_scale = params.ui_scale if txt_width_mode == 'KEEP' else params.scale
+    if txt_width_mode == 'KEEP' and note.depth > 0:
+        current_scale *= (KeepDepthFactor ** note.depth)
+    info.txt_scale = current_scale
+
+    pad = PaddingX * current_scale
+    fs = max(1, int(note.font_size * current_scale))
+    separator = "" if note.is_document else params.separator
+
+    # 计算宽度
+    if txt_width_mode in {'FIT', 'KEEP'}:
+        layout = get_text_layout(metrics, note.text, separator, fs, txt_width_mode, 0, params.markup)
+        run_scale = 1.0
+        note_width = layout.max_line_width + (pad * 2)
+        txt_height = layout.height + pad * 2 if layout.lines else 0
+    else:
+        if txt_width_mode == 'AUTO':
+            view_width = max(note.node_width, MinAutoWidth)
+        else:
+            view_width = note.txt_bg_width
+        note_width = view_width * params.view_scale
+        # 文本换行: 在量化后的缩放档位上换行, 连续缩放时复用同一结果
+        bucket_scale = quantize_scale(current_scale)
+        bucket_fs = max(1, int(note.font_size * bucket_scale))
+        # 绘制时按 fs / bucket_fs 缩放; fs 向下取整后不超过 font_size * current_scale,
+        # 按未取整的字号换算换行宽度, 缩放后的行一定放得下, 且同一档位内宽度不变可以复用
+        wrap_width = int((note_width / current_scale - PaddingX*2) * bucket_fs / note.font_size)
+        layout = get_text_layout(metrics, note.text, separator, bucket_fs, txt_width_mode, wrap_width, params.markup)
+        run_scale = fs / bucket_fs
+        txt_height = (len(layout.lines) * fs * LineHeight) + pad * 2 if layout.lines else 0
+
+    info.txt_width = note_width
+    info.txt_height = txt_height
+    info.txt_lines = layout.lines
+    info.txt_runs = layout.runs
+    info.txt_run_scale = run_scale
+    info.txt_font_size = fs
+    info.txt_should_draw = True
+
+def _set_image_layout(info: NoteLayout, note: NoteRecord, params: LayoutParams) -> None:
+    """设置图像注释的尺寸信息"""
+    img_w, img_h = note.image_size  # type: ignore
+    img_width_mode = note.img_width_mode
+    info.img_scale = params.ui_scale if img_width_mode == 'KEEP' else params.scale
+
+    # 计算宽度
+    if img_width_mode == 'ORIGINAL':
+        base_width = img_w * params.scale
+    elif img_width_mode == 'AUTO':
+        base_width = max(info.right_x - info.left_x, MinAutoWidth * params.view_scale)
+    elif img_width_mode == 'KEEP':
+        base_width = note.img_width * params.ui_scale
+    else:
+        base_width = note.img_width * params.view_scale
+
+    info.img_width = base_width
+    info.img_height = base_width * (img_h / img_w) if img_w > 0 else 0
+    info.img_should_draw = True
+
+def _set_stacked_position(info: NoteLayout, note: NoteRecord, alignment: AlignMode) -> None:
+    """计算堆叠情况下的元素位置"""
+    swap = note.swap_order
+    txt_w, txt_h = info.txt_width, info.txt_height
+    img_w, img_h = info.img_width, info.img_height
+
+    if not swap:
+        inner_w, inner_h, inner_off = txt_w, txt_h, note.txt_offset
+        outer_w, outer_h, outer_off = img_w, img_h, note.img_offset
+        inner_scale = info.txt_scale
+        outer_scale = info.img_scale
+    else:
+        inner_w, inner_h, inner_off = img_w, img_h, note.img_offset
+        outer_w, outer_h, outer_off = txt_w, txt_h, note.txt_offset
+        inner_scale = info.img_scale
+        outer_scale = info.txt_scale
+
+    inner_x, inner_y = calc_note_pos(info, alignment, inner_off, inner_w, inner_h, inner_scale)
+    offset_x_scaled, offset_y_scaled = outer_off[0] * outer_scale, outer_off[1] * outer_scale
+
+    if alignment == 'TOP':
+        outer_x, outer_y = inner_x + offset_x_scaled, inner_y + inner_h + offset_y_scaled
+    elif alignment == 'BOTTOM':
+        outer_x, outer_y = inner_x + offset_x_scaled, inner_y - outer_h + offset_y_scaled
+    elif alignment == 'LEFT':
+        outer_x, outer_y = inner_x - outer_w + offset_x_scaled, info.top_y - outer_h + offset_y_scaled
+    else:
+        outer_x, outer_y = inner_x + inner_w + offset_x_scaled, info.top_y - outer_h + offset_y_scaled
+
+    if not swap:
+        info.txt_x, info.txt_y = inner_x, inner_y
+        info.img_x, info.img_y = outer_x, outer_y
+    else:
+        info.txt_x, info.txt_y = outer_x, outer_y
+        info.img_x, info.img_y = inner_x, inner_y
+
+def _set_non_stacked_position(info: NoteLayout, note: NoteRecord) -> None:
+    """计算非堆叠情况下的元素位置"""
+    txt_x = txt_y = img_x = img_y = 0.0
+    if info.txt_should_draw:
+        txt_x, txt_y = calc_note_pos(info, note.txt_pos, note.txt_offset, info.txt_width, info.txt_height, info.txt_scale)
+    if info.img_should_draw:
+        img_x, img_y = calc_note_pos(info, note.img_pos, note.img_offset, info.img_width, info.img_height, info.img_scale)
+    info.txt_x, info.txt_y = txt_x, txt_y
+    info.img_x, info.img_y = img_x, img_y
+
+def _set_center_align(info: NoteLayout, note: NoteRecord) -> None:
+    """应用居中偏移(仅对TOP/BOTTOM对齐有效)"""
+    node_width = info.right_x - info.left_x
+    if info.txt_should_draw and note.txt_center and note.txt_pos in {'TOP', 'BOTTOM'}:
+        info.txt_x += (node_width - info.txt_width) / 2
+    if info.img_should_draw and note.img_center and note.img_pos in {'TOP', 'BOTTOM'}:
+        info.img_x += (node_width - info.img_width) / 2
+
+def set_note_position(info: NoteLayout, note: NoteRecord) -> None:
+    if note.txt_pos == note.img_pos:
+        _set_stacked_position(info, note, note.txt_pos)
+    else:
+        _set_non_stacked_position(info, note)
+    _set_center_align(info, note)
+
+# region 入口
+
+def layout_note(note: NoteRecord, rect: tuple[float, float, float, float], params: LayoutParams, metrics: FontMetrics,
+                show_text: bool = True) -> NoteLayout:
+    """计算单个笔记的排版, rect 为节点屏幕空间 (left_x, top_y, right_x, bottom_y)"""
+    left_x, top_y, right_x, bottom_y = rect
+    info = NoteLayout(top_y=top_y, bottom_y=bottom_y, left_x=left_x, right_x=right_x)
+    if note.text and note.show_txt and show_text:
+        _set_text_layout(info, note, params, metrics)
+    if note.image_size and note.show_img:
+        _set_image_layout(info, note, params)
+    set_note_position(info, note)
+    return info
+
+if __name__ == "__main__":
+    # 无头性能测试: python layout.py
+    import random
+    import timeit
+
+    random.seed(0)
+    words = ["node", "geometry", "注释", "采样", "Mix", "Shader", "★", "⚠", "vector", "math"]
+    notes = [
+        NoteRecord(
+            text=";".join(" ".join(random.choices(words, k=random.randint(3, 30))) for _ in range(random.randint(1, 6))),
+            txt_width_mode=random.choice(['AUTO', 'FIT', 'MANUAL', 'KEEP']),
+            txt_pos=random.choice(['TOP', 'BOTTOM', 'LEFT', 'RIGHT']),
+            image_size=random.choice([None, (640, 480)]),
+            depth=random.randint(0, 3),
+        )
+        for _ in range(800)
+    ]
+    rects = [(x * 10.0, 500.0, x * 10.0 + 140, 300.0) for x in range(len(notes))]
+    params = LayoutParams(scale=1.0, ui_scale=1.0, view_scale=1.0, separator=";|\\")
+    metrics = FixedWidthMetrics()
+
+    def run() -> None:
+        for note, rect in zip(notes, rects):
+            layout_note(note, rect, params, metrics)
+
+    def run_cold() -> None:
+        text_layout_cache.clear()
+        paragraph_cache.clear()
+        markup_cache.clear()
+        run()
+
+    cold = timeit.timeit(run_cold, number=5) / 5
+    warm = timeit.timeit(run, number=5) / 5
+    print(f"{len(notes)} notes: cold {cold * 1000:.1f} ms/frame, warm {warm * 1000:.1f} ms/frame")
+    print(f"layout cache: {len(text_layout_cache)} entries, hits {text_layout_cache.hits}, misses {text_layout_cache.misses}")
+
+    # 连续缩放: 同一缩放档位内不重新换行
+    text_layout_cache.hits = text_layout_cache.misses = 0
+    for step in range(20):
+        params = LayoutParams(scale=1.0 + step * 0.002, ui_scale=1.0, view_scale=1.0 + step * 0.002, separator=";|\\")
+        run()
+    print(f"zoom sweep: hits {text_layout_cache.hits}, misses {text_layout_cache.misses}")
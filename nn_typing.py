@@ -1,5 +1,5 @@
 from typing import Literal
-from bpy.types import Node, Image
+from bpy.types import Node, Image, Text
 float2 = tuple[float, float]
 int2 = tuple[int, int]
 int3 = tuple[int, int, int]
@@ -17,8 +17,11 @@ class NotedNode(Node):
     note_show_badge: bool
     note_swap_order: bool
     note_text: str
+    note_text_block: Text | None
     note_image: Image | None
     note_badge_index: int
+    note_category: int
+    note_pinned: bool
     note_text_color: RGBA
     note_txt_bg_color: RGBA
     note_badge_color: RGBA
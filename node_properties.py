@@ -1,60 +1,155 @@
 import bpy
-from bpy.types import Node
+from bpy.app.handlers import persistent
+from bpy.types import Node, NodeTree
 from bpy.props import StringProperty, IntProperty, FloatVectorProperty, BoolProperty, PointerProperty, EnumProperty, IntVectorProperty
-from .preferences import pref, tag_redraw, align_items, txt_width_items, img_width_items
+from .preferences import pref, tag_redraw, align_items, txt_width_items, img_width_items, CategoryCount, PresetCount
+from . import templates
+from . import registry
+from . import dirty
+from . import search_index
+from .utils import iter_node_trees
+from .note_data import NoteKey, DataVersionKey, get_note_data, ensure_note_data, note_default, set_defaults, legacy_storages, has_legacy_note
+
+# 宽度模式的枚举值固定为完整列表中的下标, 转接点去掉第一项后值不变
+_txt_width_enum = [(*item, i) for i, item in enumerate(txt_width_items)]
+_img_width_enum = [(*item, i) for i, item in enumerate(img_width_items)]
 
 def get_txt_width_items(self, context):
     if self.bl_idname == "NodeReroute":
-        return txt_width_items[1:]
-    return txt_width_items
+        return _txt_width_enum[1:]
+    return _txt_width_enum
 
 def get_img_width_items(self, context):
     if self.bl_idname == "NodeReroute":
-        return img_width_items[1:]
-    return img_width_items
+        return _img_width_enum[1:]
+    return _img_width_enum
+
+def update_note_style(self, context):
+    dirty.mark_node(self)
+    tag_redraw(self, context)
+
+def update_note_summary(self, context):
+    dirty.mark_content(self)
+    tag_redraw(self, context)
+
+def update_note_content(self, context):
+    registry.update_node(self)
+    update_note_summary(self, context)
+
+def update_note_text(self, context):
+    templates.refresh_node(self)
+    search_index.update_node(self)
+    update_note_content(self, context)
+
+def _mirror_pointer(node: Node, key: str, value) -> None:
+    """指针属性不支持 get/set, 额外写入笔记数据, 跨版本打开时据此恢复"""
+    if value is not None:
+        ensure_note_data(node)[key] = value
+    else:
+        data = get_note_data(node)
+        if data is not None and key in data:
+            del data[key]
+
+def update_note_text_block(self, context):
+    _mirror_pointer(self, "text_block", self.note_text_block)
+    update_note_content(self, context)
+
+def update_note_image(self, context):
+    _mirror_pointer(self, "image", self.note_image)
+    update_note_content(self, context)
+
+def _legacy_get(node: Node, key: str):
+    """尚未迁移的旧版存储中的值, 没有时返回 None"""
+    prop = "note_" + key
+    for storage in legacy_storages(node):
+        if prop in storage:
+            return _legacy_value(node, prop, storage[prop])
+    return None
+
+def _accessors(key: str, convert):
+    def getter(self):
+        data = self.get(NoteKey)
+        if data is not None:
+            if key in data:
+                return convert(data[key])
+        else:
+            # 追加/粘贴/链接进来还没迁移的旧数据
+            value = _legacy_get(self, key)
+            if value is not None:
+                return convert(value)
+        return note_default(key)
+
+    def setter(self, value):
+        ensure_note_data(self)[key] = convert(value)
+    return {"get": getter, "set": setter}
+
+def _vector(value) -> list:
+    return list(value)
+
+def _enum_accessors(key: str, items: list):
+    identifiers = [item[0] for item in items]
+
+    def getter(self):
+        data = self.get(NoteKey)
+        identifier = data.get(key) if data is not None else _legacy_get(self, key)
+        if identifier not in identifiers:
+            identifier = note_default(key)
+        value = identifiers.index(identifier)
+        if value == 0 and items is not align_items and self.bl_idname == "NodeReroute":
+            return 1    # 转接点不支持跟随节点宽度
+        return value
 
-def enum_to_int(enum: str):
-    if enum == txt_width_items[0][0]:
-        return 0
-    if enum == txt_width_items[1][0] or enum == img_width_items[1][0]:
-        return 1
-    if enum == txt_width_items[2][0]:
-        return 2
+    def setter(self, value):
+        ensure_note_data(self)[key] = identifiers[value]
+    return {"get": getter, "set": setter}
 
 def init_props():
     prefs = pref()
-    Node.note_show_txt       = BoolProperty(name="Show Text", default=True, update=tag_redraw)
-    Node.note_show_img       = BoolProperty(name="Show Image", default=True, update=tag_redraw)
-    Node.note_show_badge     = BoolProperty(name="Show Index", default=True, update=tag_redraw)
-    Node.note_swap_order     = BoolProperty(name="Swap Position", default=False, description="Swap image and text order", update=tag_redraw)
-    Node.note_text           = StringProperty(name="Text", default="", options={'TEXTEDIT_UPDATE'}, update=tag_redraw)
-    Node.note_image          = PointerProperty(name="Image", type=bpy.types.Image, update=tag_redraw) # type: ignore
-    Node.note_badge_index    = IntProperty(name="Index", default=0, min=0, description="Badge Index (0 to hide)", update=tag_redraw)
+    set_defaults(
+        show_txt=True, show_img=True, show_badge=True, swap_order=False, text="", badge_index=0, category=0, pinned=False,
+        text_color=list(prefs.default_text_color), txt_bg_color=list(prefs.default_txt_bg_color), badge_color=list(prefs.default_badge_color),
+        font_size=prefs.default_font_size, txt_bg_width=prefs.default_txt_bg_width, img_width=prefs.default_img_width,
+        txt_width_mode=prefs.default_txt_width_mode, img_width_mode=prefs.default_img_width_mode,
+        txt_pos=prefs.default_txt_pos, img_pos=prefs.default_img_pos,
+        txt_center=False, img_center=True, txt_offset=[0, 0], img_offset=[0, 0],
+    )
+    Node.note_show_txt       = BoolProperty(name="Show Text", default=True, update=update_note_style, **_accessors("show_txt", bool))
+    Node.note_show_img       = BoolProperty(name="Show Image", default=True, update=update_note_style, **_accessors("show_img", bool))
+    Node.note_show_badge     = BoolProperty(name="Show Index", default=True, update=update_note_style, **_accessors("show_badge", bool))
+    Node.note_swap_order     = BoolProperty(name="Swap Position", default=False, description="Swap image and text order", update=update_note_style, **_accessors("swap_order", bool))
+    Node.note_text           = StringProperty(name="Text", default="", options={'TEXTEDIT_UPDATE'}, update=update_note_text, **_accessors("text", str))
+    Node.note_text_block     = PointerProperty(name="Text Block", type=bpy.types.Text, description="Use a text datablock as long-form note body", update=update_note_text_block) # type: ignore
+    Node.note_image          = PointerProperty(name="Image", type=bpy.types.Image, update=update_note_image) # type: ignore
+    Node.note_badge_index    = IntProperty(name="Index", default=0, min=0, description="Badge Index (0 to hide)", update=update_note_content, **_accessors("badge_index", int))
+    Node.note_category       = IntProperty(name="Category", default=0, min=0, max=CategoryCount - 1, description="Note category for visibility filtering, 1-6 follow the color presets, 0 = others", update=update_note_summary, **_accessors("category", int))
+    Node.note_pinned         = BoolProperty(name="Pin", default=False, description="Show the first line of this note on group nodes that use this node tree", update=update_note_summary, **_accessors("pinned", bool))
     
-    Node.note_text_color     = FloatVectorProperty(name="Font Color", subtype='COLOR', size=4, default=prefs.default_text_color, min=0.0, max=1.0, update=tag_redraw)
-    Node.note_txt_bg_color   = FloatVectorProperty(name="Background Color", subtype='COLOR', size=4, default=prefs.default_txt_bg_color, min=0.0, max=1.0, update=tag_redraw)
-    Node.note_badge_color    = FloatVectorProperty(name="Background Color", subtype='COLOR', size=4, default=prefs.default_badge_color, min=0.0, max=1.0, update=tag_redraw)
-    Node.note_font_size      = IntProperty(name="Font Size", default=prefs.default_font_size, min=4, max=500)
-    Node.note_txt_bg_width   = IntProperty(name="Background Width", default=prefs.default_txt_bg_width, min=1)
-    Node.note_img_width      = IntProperty(name="Image Width", default=prefs.default_img_width, min=10)
-    Node.note_txt_width_mode = EnumProperty(name="Width Mode", items=get_txt_width_items, default=enum_to_int(prefs.default_txt_width_mode))
-    Node.note_img_width_mode = EnumProperty(name="Width Mode", items=get_img_width_items, default=enum_to_int(prefs.default_img_width_mode))
-    Node.note_txt_pos        = EnumProperty(name="Alignment Mode", items=align_items, default=prefs.default_txt_pos, description="Text Position")
-    Node.note_img_pos        = EnumProperty(name="Alignment Mode", items=align_items, default=prefs.default_img_pos, description="Image Position")
-    Node.note_txt_center     = BoolProperty(name="Center", default=False, description="Center when top/bottom aligned")
-    Node.note_img_center     = BoolProperty(name="Center", default=True, description="Center when top/bottom aligned")
-
-    Node.note_txt_offset     = IntVectorProperty(name="Offset", size=2, default=(0, 0), subtype='XYZ', description="Text and Image offset", update=tag_redraw)
-    Node.note_img_offset     = IntVectorProperty(name="Offset", size=2, default=(0, 0), subtype='XYZ', description="Image offset", update=tag_redraw)
+    Node.note_text_color     = FloatVectorProperty(name="Font Color", subtype='COLOR', size=4, default=prefs.default_text_color, min=0.0, max=1.0, update=update_note_style, **_accessors("text_color", _vector))
+    Node.note_txt_bg_color   = FloatVectorProperty(name="Background Color", subtype='COLOR', size=4, default=prefs.default_txt_bg_color, min=0.0, max=1.0, update=update_note_style, **_accessors("txt_bg_color", _vector))
+    Node.note_badge_color    = FloatVectorProperty(name="Background Color", subtype='COLOR', size=4, default=prefs.default_badge_color, min=0.0, max=1.0, update=update_note_style, **_accessors("badge_color", _vector))
+    Node.note_font_size      = IntProperty(name="Font Size", default=prefs.default_font_size, min=4, max=500, update=update_note_style, **_accessors("font_size", int))
+    Node.note_txt_bg_width   = IntProperty(name="Background Width", default=prefs.default_txt_bg_width, min=1, update=update_note_style, **_accessors("txt_bg_width", int))
+    Node.note_img_width      = IntProperty(name="Image Width", default=prefs.default_img_width, min=10, update=update_note_style, **_accessors("img_width", int))
+    Node.note_txt_width_mode = EnumProperty(name="Width Mode", items=get_txt_width_items, update=update_note_style, **_enum_accessors("txt_width_mode", txt_width_items))
+    Node.note_img_width_mode = EnumProperty(name="Width Mode", items=get_img_width_items, update=update_note_style, **_enum_accessors("img_width_mode", img_width_items))
+    Node.note_txt_pos        = EnumProperty(name="Alignment Mode", items=align_items, description="Text Position", update=update_note_style, **_enum_accessors("txt_pos", align_items))
+    Node.note_img_pos        = EnumProperty(name="Alignment Mode", items=align_items, description="Image Position", update=update_note_style, **_enum_accessors("img_pos", align_items))
+    Node.note_txt_center     = BoolProperty(name="Center", default=False, description="Center when top/bottom aligned", update=update_note_style, **_accessors("txt_center", bool))
+    Node.note_img_center     = BoolProperty(name="Center", default=True, description="Center when top/bottom aligned", update=update_note_style, **_accessors("img_center", bool))
+
+    Node.note_txt_offset     = IntVectorProperty(name="Offset", size=2, default=(0, 0), subtype='XYZ', description="Text and Image offset", update=update_note_style, **_accessors("txt_offset", _vector))
+    Node.note_img_offset     = IntVectorProperty(name="Offset", size=2, default=(0, 0), subtype='XYZ', description="Image offset", update=update_note_style, **_accessors("img_offset", _vector))
 
 # 不要忘记往 NotedNode 和 NODE_OT_note_copy_active_style 新增
 base_props = [
     "note_text",
+    "note_text_block",
     "note_image",
     "note_badge_index",
     "note_show_txt",
     "note_show_img",
     "note_show_badge",
+    "note_pinned",
 ]
 style_props = [
     "note_font_size",
@@ -64,6 +159,7 @@ style_props = [
     "note_img_width",
     "note_swap_order",
     "note_badge_color",
+    "note_category",
     "note_txt_width_mode",
     "note_img_width_mode",
     "note_txt_pos",
@@ -78,3 +174,98 @@ def delete_props():
     for prop in base_props + style_props:
         if hasattr(Node, prop):
             delattr(Node, prop)
+
+# region 数据迁移
+
+MigrateVersion = 2
+""" 1: 旧的逐属性存储转为稀疏存储, 2: 按背景色推断分类 """
+PointerKeys = {"note_text_block": "text_block", "note_image": "image"}
+DynamicEnums = {"note_txt_width_mode": txt_width_items, "note_img_width_mode": img_width_items}
+StaticEnums = {"note_txt_pos": align_items, "note_img_pos": align_items}
+
+def _legacy_value(node: Node, prop: str, value):
+    if prop in DynamicEnums:
+        # 旧数据存的是动态列表中的下标, 转接点的列表少了第一项
+        items = DynamicEnums[prop]
+        index = value + 1 if node.bl_idname == "NodeReroute" else value
+        return items[min(index, len(items) - 1)][0]
+    if prop in StaticEnums:
+        return StaticEnums[prop][value][0]
+    if hasattr(value, "to_list"):
+        return value.to_list()
+    return value
+
+def migrate_legacy_storage(node: Node) -> None:
+    """把旧版逐属性存储的值移入 node["node_note"]"""
+    for storage in legacy_storages(node):
+        for prop in base_props + style_props:
+            if prop in PointerKeys or prop not in storage: continue
+            value = _legacy_value(node, prop, storage[prop])
+            del storage[prop]
+            ensure_note_data(node)[prop.removeprefix("note_")] = value
+    for prop, key in PointerKeys.items():
+        value = getattr(node, prop)
+        if value is not None:
+            ensure_note_data(node)[key] = value
+
+def restore_pointers(node: Node) -> None:
+    """指针属性在另一版本保存后会丢失, 从笔记数据中恢复"""
+    data = get_note_data(node)
+    if data is None: return
+    for prop, key in PointerKeys.items():
+        value = data.get(key)
+        if value is not None and getattr(node, prop) is None:
+            setattr(node, prop, value)
+
+def migrate_note_categories(tree: NodeTree, nodes=None) -> None:
+    """旧文件按背景色与预设匹配推断分类, 不指定 nodes 时处理整棵树"""
+    if tree.library: return    # 链接进来的节点树只读
+    prefs = pref()
+    presets = [tuple(getattr(prefs, f"col_preset_{i}")) for i in range(1, PresetCount + 1)]
+    for node in tree.nodes if nodes is None else nodes:
+        if NoteKey not in node or node.note_category or not (node.note_text or node.note_text_block):
+            continue
+        color = tuple(node.note_txt_bg_color)
+        for category, preset in enumerate(presets, start=1):
+            if all(abs(a - b) < 0.001 for a, b in zip(color, preset)):
+                node.note_category = category
+                break
+
+def migrate_tree(tree: NodeTree) -> None:
+    if tree.library: return
+    version = tree.get(DataVersionKey, 0)
+    # 已迁移的节点树里也可能粘贴进旧数据的节点
+    legacy = [node for node in tree.nodes if version < 1 or (NoteKey not in node and has_legacy_note(node))]
+    for node in legacy:
+        migrate_legacy_storage(node)
+    if version >= 1:
+        for node in tree.nodes:
+            restore_pointers(node)
+    if version < 2:
+        migrate_note_categories(tree)
+    elif legacy:
+        migrate_note_categories(tree, legacy)
+    if version < MigrateVersion:
+        tree[DataVersionKey] = MigrateVersion
+    # 追加/链接进来的节点可能带着与现有笔记相同的标识
+    registry.assign_unique_uuids(tree)
+
+def _migrate_all() -> None:
+    for tree in iter_node_trees():
+        migrate_tree(tree)
+
+@persistent
+def _on_load_post(*args) -> None:
+    _migrate_all()
+
+def register() -> None:
+    # 加载后追加/粘贴进来的旧数据由登记表扫描时发现, 在定时器中迁移
+    registry.set_migrator(migrate_tree)
+    bpy.app.handlers.load_post.append(_on_load_post)
+    # 启用插件时当前文件不会触发 load_post, 注册期间无法访问 bpy.data
+    bpy.app.timers.register(_migrate_all, first_interval=0.1)
+
+def unregister() -> None:
+    registry.set_migrator(None)
+    if _on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load_post)
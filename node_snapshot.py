@@ -0,0 +1,160 @@
+from dataclasses import dataclass
+import bpy
+import numpy as np
+from bpy.types import Nodes
+from .note_data import NoteKey, UuidKey, note_default, note_uuid, note_values
+
+# 每帧一次性读取节点属性, 避免逐节点逐属性的 RNA 访问
+# 几何属性用 foreach_get 批量读取; 笔记属性是稀疏存储的访问器, 只读取登记表中有笔记的节点的数据字典
+# 字符串/枚举/指针(文本, 图片, 模式)仍在绘制时按节点单独读取
+
+@dataclass
+class NodeSnapshot:
+    """节点树所有节点的数值属性快照, 第 i 行对应 tree.nodes[i]"""
+    count: int
+    uuids: list[str]
+    """ 笔记标识, 没有笔记的节点为空字符串 """
+    show_txt: np.ndarray
+    show_img: np.ndarray
+    show_badge: np.ndarray
+    swap_order: np.ndarray
+    txt_center: np.ndarray
+    img_center: np.ndarray
+    badge_index: np.ndarray
+    category: np.ndarray
+    font_size: np.ndarray
+    txt_bg_width: np.ndarray
+    img_width: np.ndarray
+    txt_offset: np.ndarray
+    """ (n, 2) """
+    img_offset: np.ndarray
+    text_color: np.ndarray
+    """ (n, 4) """
+    txt_bg_color: np.ndarray
+    badge_color: np.ndarray
+    location: np.ndarray
+    """ (n, 2) 节点坐标, 支持时为绝对坐标 """
+    has_abs_location: bool
+    width: np.ndarray
+    dimensions: np.ndarray
+    """ (n, 2) 屏幕像素尺寸(含 UI 缩放) """
+    hide: np.ndarray
+    select: np.ndarray
+
+    def note_mask(self) -> np.ndarray:
+        """可能有笔记需要绘制的节点(文本/图片是否为空需再单独判断)"""
+        return self.show_txt | self.show_img | (self.show_badge & (self.badge_index > 0))
+
+def _read(nodes: Nodes, attr: str, dtype, size: int = 1) -> np.ndarray:
+    data = np.empty(len(nodes) * size, dtype=dtype)
+    nodes.foreach_get(attr, data)
+    return data if size == 1 else data.reshape(-1, size)
+
+def has_location_absolute() -> bool:
+    """Blender 4.4+ 提供 location_absolute"""
+    return "location_absolute" in bpy.types.Node.bl_rna.properties
+
+NoteColumns = {
+    "show_txt": (bool, 1), "show_img": (bool, 1), "show_badge": (bool, 1), "swap_order": (bool, 1),
+    "txt_center": (bool, 1), "img_center": (bool, 1),
+    "badge_index": (np.int32, 1), "category": (np.int32, 1),
+    "font_size": (np.int32, 1), "txt_bg_width": (np.int32, 1), "img_width": (np.int32, 1),
+    "txt_offset": (np.int32, 2), "img_offset": (np.int32, 2),
+    "text_color": (np.float32, 4), "txt_bg_color": (np.float32, 4), "badge_color": (np.float32, 4),
+}
+""" 快照中的笔记字段: 键 -> (类型, 分量数) """
+
+def _read_notes(nodes: Nodes, indices: list[int]) -> dict[str, np.ndarray | list[str]]:
+    """笔记字段按默认值填满, 再写入有笔记的节点存储的值"""
+    count = len(nodes)
+    uuids = [""] * count
+    columns = {}
+    for key, (dtype, size) in NoteColumns.items():
+        column = np.empty(count if size == 1 else (count, size), dtype=dtype)
+        column[:] = note_default(key)
+        columns[key] = column
+    for i in indices:
+        node = nodes[i]
+        if NoteKey in node:
+            values = note_values(node)
+        else:
+            # 链接资产中的旧版笔记, 通过访问器回退读取旧存储
+            values = {key: getattr(node, "note_" + key) for key in columns}
+            values[UuidKey] = note_uuid(node)
+        uuids[i] = values.get(UuidKey, "")
+        for key, column in columns.items():
+            column[i] = values[key]
+    return {"uuids": uuids, **columns}
+
+def take_snapshot(nodes: Nodes, indices: list[int]) -> NodeSnapshot:
+    """一次性读取所有节点的几何属性和 indices 中节点的笔记属性"""
+    has_abs = has_location_absolute()
+    return NodeSnapshot(
+        count=len(nodes),
+        **_read_notes(nodes, indices),
+        location=_read(nodes, "location_absolute" if has_abs else "location", np.float32, 2),
+        has_abs_location=has_abs,
+        width=_read(nodes, "width", np.float32),
+        dimensions=_read(nodes, "dimensions", np.float32, 2),
+        hide=_read(nodes, "hide", bool),
+        select=_read(nodes, "select", bool),
+    )
+
+class NodeHierarchy:
+    """按需解析父级(框)关系: 只沿 indices 中节点的父级链向上读取, 同一个祖先只解析一次
+    得到这些节点的绝对坐标和嵌套深度, 其它节点保持快照中的坐标, 深度为 0"""
+    def __init__(self, nodes: Nodes, snap: NodeSnapshot, indices: list[int]):
+        self._nodes = nodes
+        self._snap = snap
+        self._indices = indices
+        self._locations: np.ndarray | None = None
+        self._depths: np.ndarray | None = None
+
+    @property
+    def locations(self) -> np.ndarray:
+        """绝对坐标 (n, 2)"""
+        if self._locations is None:
+            if self._snap.has_abs_location:
+                self._locations = self._snap.location
+            else:
+                self._resolve()
+        return self._locations  # type: ignore
+
+    @property
+    def depths(self) -> np.ndarray:
+        """框嵌套深度"""
+        if self._depths is None:
+            self._resolve()
+        return self._depths  # type: ignore
+
+    def _resolve(self) -> None:
+        nodes = self._nodes
+        snap = self._snap
+        accumulate = not snap.has_abs_location
+        locations = snap.location.copy() if accumulate else snap.location
+        depths = np.zeros(snap.count, dtype=np.int32)
+        resolved: dict[str, tuple[float, float, int]] = {}
+        """ 节点名 -> (绝对坐标 x, y, 深度) """
+        for i in self._indices:
+            node = nodes[i]
+            name = node.name
+            chain = []
+            while node is not None and node.name not in resolved:
+                chain.append(node)
+                node = node.parent
+            x, y, depth = resolved[node.name] if node is not None else (0.0, 0.0, -1)
+            for link in reversed(chain):
+                # 4.4 之前 location 是相对父级的坐标, 逐级累加
+                if accumulate:
+                    dx, dy = link.location
+                    x += dx
+                    y += dy
+                depth += 1
+                resolved[link.name] = (x, y, depth)
+            x, y, depth = resolved[name]
+            if accumulate:
+                locations[i] = (x, y)
+            depths[i] = depth
+        self._depths = depths
+        if self._locations is None:
+            self._locations = locations
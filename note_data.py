@@ -0,0 +1,80 @@
+import uuid
+from bpy.types import Node
+
+# 笔记的稀疏存储: 只有带笔记的节点才有一个自定义属性字典 node["node_note"], 键为属性名去掉 "note_" 前缀
+# Node 上的 note_* 属性只是 get/set 访问器, 本身不占存储; 自定义属性在 4.x 和 5.x 之间都能互相读取
+
+NoteKey = "node_note"
+""" 节点上的笔记数据 """
+DataVersionKey = "node_note_version"
+""" 节点树上的数据版本, 用于一次性迁移 """
+UuidKey = "uuid"
+""" 笔记的持久标识, 节点改名后不变; 复制节点会连同标识一起复制, 由登记表发现后重新分配 """
+
+LegacyNoteProps = ("note_text", "note_image", "note_badge_index")
+""" 旧版逐属性存储中有其一即为有笔记 """
+LegacyUuidPrefix = "legacy:"
+""" 链接资产中的旧版笔记不能迁移写入标识, 用节点名代替(链接的节点不能改名) """
+
+_defaults: dict[str, object] = {}
+""" 未存储的字段返回的默认值, 注册属性时按偏好设置填充 """
+
+def set_defaults(**values) -> None:
+    _defaults.update(values)
+
+def note_default(key: str):
+    return _defaults[key]
+
+def new_uuid() -> str:
+    return uuid.uuid4().hex
+
+def get_note_data(node: Node):
+    """笔记数据(IDPropertyGroup), 没有笔记返回 None"""
+    return node.get(NoteKey)
+
+def ensure_note_data(node: Node):
+    data = node.get(NoteKey)
+    if data is None:
+        node[NoteKey] = {UuidKey: new_uuid()}
+        data = node[NoteKey]
+    return data
+
+def remove_note_data(node: Node) -> None:
+    if NoteKey in node:
+        del node[NoteKey]
+
+def note_uuid(node: Node) -> str:
+    """笔记标识, 没有笔记返回空字符串"""
+    data = node.get(NoteKey)
+    if data is not None:
+        return data.get(UuidKey, "")
+    if node.id_data.library and has_legacy_note(node):
+        return LegacyUuidPrefix + node.name
+    return ""
+
+def note_values(node: Node) -> dict[str, object]:
+    """默认值与已存储字段合并后的普通字典"""
+    data = node.get(NoteKey)
+    if data is None:
+        return dict(_defaults)
+    return {**_defaults, **data.to_dict()}
+
+def has_note(node: Node) -> bool:
+    """有文本/文本块/图片/序号中的任意一项"""
+    data = node.get(NoteKey)
+    if data is None:
+        return False
+    return bool(data.get("text") or data.get("text_block") or data.get("image") or data.get("badge_index", 0) > 0)
+
+def legacy_storages(node: Node) -> list:
+    """旧版 bpy.props 属性的存储位置: 5.0 起在系统属性中, 之前与自定义属性在一起"""
+    storages = [node]
+    if hasattr(node, "bl_system_properties_get"):
+        system = node.bl_system_properties_get(do_create=False)
+        if system is not None:
+            storages.append(system)
+    return storages
+
+def has_legacy_note(node: Node) -> bool:
+    """还没有迁移的旧版笔记"""
+    return any(prop in storage for storage in legacy_storages(node) for prop in LegacyNoteProps)
@@ -0,0 +1,135 @@
+import bpy
+from dataclasses import dataclass, field
+from bpy.props import IntProperty
+from bpy.types import Node, NodeTree, WindowManager
+from .registry import noted_indices, find_node
+from .note_data import note_uuid
+from .search_index import SearchHit, search_notes
+from .preferences import pref
+from .utils import iter_owned_trees, text_split_lines
+from . import dirty
+from . import cache_manager
+
+# 侧栏笔记列表: 过滤和排序结果按节点树缓存, 只在笔记变化/搜索词/排序方式变化时重新计算
+# 面板重绘时只按标识取出当前页的节点, 列表长度不影响重绘开销; 有搜索词时按全文索引的得分排序
+# 当前页按节点树记在会话中(不写入偏好设置), 搜索词/排序方式变化后回到第一页
+
+NoColor = (2, 2, 2)
+""" 没有文本的笔记排在有颜色的之后 """
+
+OtherLimit = 200
+""" 其它节点树的结果最多解析这么多条(与每页数量上限一致) """
+
+@dataclass(frozen=True)
+class OtherNote:
+    """其它节点树中的搜索结果, 构建列表时解析好显示用的名字, 面板重绘时不再查找节点树和节点"""
+    tree_ptr: int
+    uid: str
+    owner_type: str
+    """ 所属 ID 所在的 bpy.data 集合名 """
+    owner_name: str
+    node_name: str
+    text: str
+    """ 笔记文本首行 """
+
+@dataclass
+class NoteList:
+    key: tuple
+    """ (时间戳, 节点数, 笔记数, 搜索词, 排序方式, 是否搜索全部节点树), 变化时重新计算 """
+    total: int
+    """ 过滤前的笔记数量 """
+    uuids: list[str] = field(default_factory=list)
+    """ 过滤排序后的笔记标识 """
+    others: list[OtherNote] = field(default_factory=list)
+    """ 搜索全部节点树时其它节点树中的结果(最多 OtherLimit 条) """
+    other_count: int = 0
+
+    def page_count(self, page_size: int) -> int:
+        return max(1, -(-len(self.uuids) // page_size))
+
+    def page(self, tree: NodeTree, page: int, page_size: int) -> list[Node]:
+        """第 page 页(从 1 开始)的节点"""
+        start = (page - 1) * page_size
+        nodes = (find_node(tree, uid) for uid in self.uuids[start:start + page_size])
+        return [node for node in nodes if node is not None]
+
+_lists: dict[int, NoteList] = {}
+""" 节点树指针 -> 列表 """
+_pages: dict[int, tuple[tuple, int]] = {}
+""" 节点树指针 -> ((搜索词, 排序方式, 是否搜索全部节点树), 当前页) """
+
+def _sort_key(node: Node, sort_mode: str) -> tuple:
+    color = tuple(node.note_txt_bg_color[:3]) if node.note_text else NoColor  # type: ignore
+    badge_idx: int = node.note_badge_index  # type: ignore
+    if sort_mode == 'COLOR_BADGE':
+        return (color, badge_idx == 0, badge_idx)
+    return (badge_idx == 0, badge_idx, color)
+
+def _other_notes(hits: list[SearchHit]) -> list[OtherNote]:
+    owners = {tree.as_pointer(): (collection_name, owner, tree) for collection_name, owner, tree in iter_owned_trees()}
+    others: list[OtherNote] = []
+    for hit in hits:
+        collection_name, owner, tree = owners.get(hit.tree_ptr, ("", None, None))
+        node = find_node(tree, hit.uid) if tree is not None else None
+        if node is None: continue
+        lines = text_split_lines(node.note_text.strip())  # type: ignore
+        others.append(OtherNote(hit.tree_ptr, hit.uid, collection_name, owner.name, node.name, lines[0] if lines else ""))
+        if len(others) >= OtherLimit: break
+    return others
+
+def get_note_list(tree: NodeTree, search: str, sort_mode: str, all_trees: bool = False) -> NoteList:
+    indices = noted_indices(tree)
+    nodes = tree.nodes
+    tree_ptr = tree.as_pointer()
+    key = (dirty.current_stamp(), len(nodes), len(indices), search, sort_mode, all_trees)
+    cached = _lists.get(tree_ptr)
+    if cached is not None and cached.key == key:
+        return cached
+    others: list[OtherNote] = []
+    other_count = 0
+    if search and all_trees:
+        hits = search_notes(search)
+        uuids = [hit.uid for hit in hits if hit.tree_ptr == tree_ptr]
+        other_hits = [hit for hit in hits if hit.tree_ptr != tree_ptr]
+        other_count = len(other_hits)
+        others = _other_notes(other_hits)
+    elif search:
+        uuids = [hit.uid for hit in search_notes(search, tree_ptr)]
+    else:
+        matched = [nodes[i] for i in indices]
+        matched.sort(key=lambda node: _sort_key(node, sort_mode))
+        uuids = [note_uuid(node) for node in matched]
+    note_list = NoteList(key, len(indices), uuids, others, other_count)
+    _lists[tree_ptr] = note_list
+    return note_list
+
+def _context_list() -> tuple[int, NoteList | None]:
+    tree = getattr(bpy.context.space_data, "edit_tree", None)
+    tree_ptr = tree.as_pointer() if tree is not None else 0
+    return tree_ptr, _lists.get(tree_ptr)
+
+def _get_page(self) -> int:
+    tree_ptr, note_list = _context_list()
+    if note_list is None: return 1
+    query, page = _pages.get(tree_ptr, ((), 1))
+    if query != note_list.key[3:]:
+        return 1
+    return min(page, note_list.page_count(pref().list_page_size))
+
+def _set_page(self, value: int) -> None:
+    tree_ptr, note_list = _context_list()
+    if note_list is None: return
+    page = max(1, min(value, note_list.page_count(pref().list_page_size)))
+    _pages[tree_ptr] = (note_list.key[3:], page)
+
+def clear_note_lists() -> None:
+    _lists.clear()
+    _pages.clear()
+
+def register() -> None:
+    WindowManager.note_list_page = IntProperty(name="Page", min=1, description="Current page of the notes list", get=_get_page, set=_set_page)  # type: ignore
+    cache_manager.register_cache("note_lists", clear_note_lists)
+
+def unregister() -> None:
+    cache_manager.unregister_cache("note_lists")
+    del WindowManager.note_list_page  # type: ignore
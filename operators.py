@@ -2,9 +2,13 @@ import bpy
 from bpy.types import Operator, Node, Context, Image, UILayout
 from typing import Callable
 from bpy.props import EnumProperty, BoolProperty, IntProperty, FloatVectorProperty
-from .preferences import pref, txt_width_items
+from .preferences import pref, txt_width_items, CategoryCount
 from .node_properties import style_props
-from .utils import import_clipboard_image, text_split_lines
+from .utils import import_clipboard_image, text_split_lines, owned_tree
+from .registry import noted_nodes, find_node, locate_note
+from .group_graph import enter_tree
+from .hit_index import hit_test
+from .note_data import remove_note_data
 from bpy.app.translations import pgettext_iface as iface
 
 class NoteBaseOperator(Operator):
@@ -47,6 +51,8 @@ class NODE_OT_note_delete_selected_txt(NoteBaseOperator):
         for node in self.get_selected_nodes(context):
             if node.note_text:
                 node.note_text = ""
+            if node.note_text_block:
+                node.note_text_block = None
         return {'FINISHED'}
 
 class NODE_OT_note_delete_selected_badge(NoteBaseOperator):
@@ -141,6 +147,8 @@ class NODE_OT_note_delete_notes(NoteDeleteOperator):
         for node in nodes_to_process:
             if self.del_text and node.note_text:
                 node.note_text = ""
+            if self.del_text and node.note_text_block:
+                node.note_text_block = None
             if self.del_image and node.note_image:
                 img = node.note_image
                 node.note_image = None
@@ -148,6 +156,9 @@ class NODE_OT_note_delete_notes(NoteDeleteOperator):
                     images_to_remove.append(img)
             if self.del_index and node.note_badge_index:
                 node.note_badge_index = 0
+            if self.del_text and self.del_image and self.del_index:
+                # 全部删除时连同样式一起移除, 节点恢复为不占存储
+                remove_note_data(node)
 
         if self.delete_image:
             for img in set(images_to_remove):
@@ -200,11 +211,24 @@ class NODE_OT_note_apply_preset(NoteBaseOperator):
     bl_label = "Apply Preset to Selected Nodes (Multi-Select)"
     bl_description = "Apply Preset to Selected Nodes (Multi-Select)"
     bg_color: bpy.props.FloatVectorProperty(size=4)
+    category: IntProperty(default=0, min=0, max=CategoryCount - 1)
 
     def execute(self, context):
         for node in self.get_selected_nodes(context):
             node.note_txt_bg_color = self.bg_color
             node.note_text_color = (1, 1, 1, 1)
+            node.note_category = self.category
+        return {'FINISHED'}
+
+class NODE_OT_note_toggle_category(Operator):
+    bl_idname = "node.note_toggle_category"
+    bl_label = "Toggle Category Visibility"
+    bl_description = "Show or hide notes of this category"
+    category: IntProperty(default=0, min=0, max=CategoryCount - 1)
+
+    def execute(self, context):
+        prefs = pref()
+        prefs.category_mask ^= 1 << self.category
         return {'FINISHED'}
 
 class NODE_OT_note_copy_active_style(NoteScopeOperator):
@@ -215,6 +239,7 @@ class NODE_OT_note_copy_active_style(NoteScopeOperator):
     sync_font_size     : BoolProperty(name="Font Size", default=True)
     sync_text_color    : BoolProperty(name="Font Color", default=True)
     sync_txt_bg_color  : BoolProperty(name="Background Color", default=True)
+    sync_category      : BoolProperty(name="Category", default=True)
     sync_txt_bg_width  : BoolProperty(name="Background Width", default=True)
     sync_txt_width_mode: BoolProperty(name="Width Mode", default=True)
     sync_txt_pos       : BoolProperty(name="Alignment Mode", default=True)
@@ -243,7 +268,7 @@ class NODE_OT_note_copy_active_style(NoteScopeOperator):
 
         for prop in style_props:
             sync_name = prop.replace("note_", "sync_")
-            if "txt" in prop or "text" in prop or "font" in prop:
+            if "txt" in prop or "text" in prop or "font" in prop or "category" in prop:
                 col1.prop(self, sync_name)
             elif "img" in prop:
                 col2.prop(self, sync_name)
@@ -401,12 +426,31 @@ class NODE_OT_note_pack_unpack_images(NoteDeleteOperator):
 class NODE_OT_note_jump_to_note(Operator):
     bl_idname = "node.note_jump_to_note"
     bl_label = "Jump to Node with Note"
-    bl_description = "Jump to the node containing the note"
-    node_name: bpy.props.StringProperty()
+    bl_description = "Jump to the node containing the note, entering nested node groups if needed"
+    note_id: bpy.props.StringProperty()
+    owner_type: bpy.props.StringProperty(description="bpy.data collection of the ID owning the target node tree, empty for the current tree")
+    owner_name: bpy.props.StringProperty()
 
     def execute(self, context):
-        nodes = context.space_data.edit_tree.nodes
-        target_node = nodes[self.node_name]
+        space = context.space_data
+        tree = space.edit_tree
+        # 复制节点组/跨节点树粘贴会带着相同的笔记标识, 其它节点树中的笔记按 (节点树, 标识) 查找
+        if self.owner_type:
+            target_tree = owned_tree(self.owner_type, self.owner_name)
+            target_node = find_node(target_tree, self.note_id) if target_tree is not None else None
+        else:
+            target_tree, target_node = tree, find_node(tree, self.note_id)
+            if target_node is None:
+                target_tree, target_node = locate_note(self.note_id)
+        if target_node is None:
+            return {'CANCELLED'}
+        if target_tree != tree:
+            # 笔记在其它节点树中: 沿节点组嵌套关系进入
+            if not enter_tree(space, target_tree):
+                self.report({'WARNING'}, "The note is not inside a node group reachable from the current node tree")
+                return {'CANCELLED'}
+            tree = target_tree
+        nodes = tree.nodes
         for node in nodes:
             node.select = False
         target_node.select = True
@@ -553,7 +597,7 @@ class NODE_OT_note_interactive_badge(Operator):
             max_idx = 0
             tree = context.space_data.edit_tree
             if tree:
-                max_idx = max((node.note_badge_index for node in tree.nodes), default=0)
+                max_idx = max((node.note_badge_index for node in noted_nodes(tree)), default=0)
 
             self.current_idx = max_idx
             self.last_node = None
@@ -665,6 +709,70 @@ class NODE_OT_note_text_from_node_label(NoteScopeOperator):
         context.area.tag_redraw()
         return {'FINISHED'}
 
+class NODE_OT_note_drag(Operator):
+    bl_idname = "node.note_drag"
+    bl_label = "Drag Note"
+    bl_description = "Click a note to select its node, drag to move the note (right-click/ESC to cancel)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    DragThreshold = 3
+    """ 移动超过这么多像素才算拖动, 否则只是点击选择 """
+
+    @classmethod
+    def poll(cls, context):
+        space = context.space_data
+        return pref().use_note_drag and space is not None and space.type == 'NODE_EDITOR' and space.edit_tree is not None
+
+    def invoke(self, context, event):
+        tree = context.space_data.edit_tree
+        hit = hit_test(context.region.as_pointer(), event.mouse_region_x, event.mouse_region_y)
+        # 没点中笔记时交给节点编辑器自己的选择/框选
+        if hit is None or hit.tree_ptr != tree.as_pointer():
+            return {'PASS_THROUGH'}
+        node = find_node(tree, hit.uid)
+        if node is None:
+            return {'PASS_THROUGH'}
+
+        for other in context.selected_nodes:
+            other.select = False
+        node.select = True
+        tree.nodes.active = node
+
+        self.node = node
+        self.prop = "note_txt_offset" if hit.kind == "TXT" else "note_img_offset"
+        self.start_offset = tuple(getattr(node, self.prop))
+        self.start_mouse = (event.mouse_region_x, event.mouse_region_y)
+        self.scale = hit.scale if hit.scale > 0 else 1.0
+        self.dragging = False
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'MOUSEMOVE':
+            dx = event.mouse_region_x - self.start_mouse[0]
+            dy = event.mouse_region_y - self.start_mouse[1]
+            if not self.dragging and abs(dx) + abs(dy) < self.DragThreshold:
+                return {'RUNNING_MODAL'}
+            if not self.dragging:
+                self.dragging = True
+                context.window.cursor_modal_set('SCROLL_XY')
+            # 偏移量按笔记自身缩放换算, 只有这一个笔记被标记为需要重新排版
+            offset = (self.start_offset[0] + round(dx / self.scale), self.start_offset[1] + round(dy / self.scale))
+            if offset != tuple(getattr(self.node, self.prop)):
+                setattr(self.node, self.prop, offset)
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'LEFTMOUSE' and event.value == 'RELEASE':
+            context.window.cursor_modal_restore()
+            return {'FINISHED'}
+
+        if event.type in {'RIGHTMOUSE', 'ESC'}:
+            setattr(self.node, self.prop, self.start_offset)
+            context.window.cursor_modal_restore()
+            return {'CANCELLED'}
+
+        return {'RUNNING_MODAL'}
+
 classes = [
     NODE_OT_note_delete_selected_txt,
     NODE_OT_note_delete_selected_img,
@@ -687,6 +795,8 @@ classes = [
     NODE_OT_note_paste_text_from_clipboard,
     NODE_OT_note_copy_text_to_clipboard,
     NODE_OT_note_text_from_node_label,
+    NODE_OT_note_toggle_category,
+    NODE_OT_note_drag,
 ]
 
 def register():
@@ -1,7 +1,11 @@
 import bpy
+import numpy as np
+from dataclasses import dataclass
 from bpy.types import AddonPreferences, Context
 from bpy.props import BoolProperty, StringProperty, FloatProperty, FloatVectorProperty, IntProperty, EnumProperty
-from .nn_typing import AlignMode, TextWidthMode, ImageWidthMode, BadgeScaleMode
+from .nn_typing import AlignMode, TextWidthMode, ImageWidthMode, BadgeScaleMode, RGBA
+from . import dirty
+from . import cache_manager
 
 align_items: list[tuple[AlignMode, str, str]] = [
     ('TOP', "Top", ""),
@@ -32,6 +36,20 @@ def tag_redraw(self, context: Context):
             if area.type == 'NODE_EDITOR':
                 area.tag_redraw()
 
+def update_draw_settings(self, context: Context):
+    """绘制相关设置变化时重建设置快照并重绘"""
+    invalidate_draw_settings()
+    dirty.mark_all()
+    tag_redraw(self, context)
+
+PresetCount = 6
+""" 颜色预设数, 分类 1~6 对应预设 1~6 """
+CategoryCount = 31
+""" 分类 0~30, 0 为其余(未分类) """
+AllCategories = (1 << CategoryCount) - 1
+OthersColor = (0.5, 0.5, 0.5, 1.0)
+""" 分类 0 及没有颜色预设的分类在节点组汇总中的颜色 """
+
 sort_mode_items: list[tuple[str, str, str]] = [
     ('COLOR_BADGE', "Color + Index", "Sort by color ascending, then by index ascending"),
     ('BADGE_COLOR', "Index + Color", "Sort by index ascending, then by color ascending"),
@@ -43,16 +61,21 @@ class NodeNoteAddonPreferences(AddonPreferences):
     # 1. Global Settings
     cursor_warp_x          : IntProperty(default=0, min=1, max=500, description="Shortcut key cursor offset")
     panel_width            : IntProperty(name="Panel Width", default=220, min=100, max=2000, description="Width of the shortcut panel")
-    show_all_notes         : BoolProperty(name="Show All", default=True)
-    show_selected_only     : BoolProperty(name="Show Selected Only", default=False, description="Only show notes of selected nodes")
-    dependent_overlay      : BoolProperty(name="Follow Overlay", default=True, description="Whether to hide notes when node editor overlay is closed")
-    show_badge_lines       : BoolProperty(name="Show Connection Lines", default=False, description="Show index lines between nodes")
+    show_all_notes         : BoolProperty(name="Show All", default=True, update=update_draw_settings)
+    show_selected_only     : BoolProperty(name="Show Selected Only", default=False, description="Only show notes of selected nodes", update=update_draw_settings)
+    dependent_overlay      : BoolProperty(name="Follow Overlay", default=True, description="Whether to hide notes when node editor overlay is closed", update=update_draw_settings)
+    show_badge_lines       : BoolProperty(name="Show Connection Lines", default=False, description="Show index lines between nodes", update=update_draw_settings)
+    show_group_rollups     : BoolProperty(name="Group Summaries", default=False, description="Show the note count, top categories and pinned note inside node groups on group nodes", update=update_draw_settings)
     is_interactive_mode    : BoolProperty(name="Interactive Mode", default=False, description="Click nodes to number, right-click or ESC to exit")
+    use_note_drag          : BoolProperty(name="Drag Notes", default=True, description="Click a note in the node editor to select its node, drag to move the note")
     list_sort_mode         : EnumProperty(name="Sort Mode", items=sort_mode_items, default='BADGE_COLOR', description="Choose list sort method")
+    list_page_size         : IntProperty(name="Page Size", default=20, min=5, max=200, description="Number of notes shown per page in the notes list")
     use_occlusion          : BoolProperty(name="Auto Occlusion", default=False)
     tag_mode_prepend       : BoolProperty(name="Prepend Mode", default=True, description="Add special characters before existing text")
-    navigator_search       : StringProperty(name="Search", default="", options={'TEXTEDIT_UPDATE'})
-    line_separator         : StringProperty(name="Line Separator", default=";|\\", options={'TEXTEDIT_UPDATE'}, description="Line break separator in text, supports multiple (separated by |), e.g.: ;|\\")
+    navigator_search       : StringProperty(name="Search", default="", options={'TEXTEDIT_UPDATE'}, description="Space separated words with prefix and fuzzy matching, #tag matches tags")
+    search_all_trees       : BoolProperty(name="All Node Trees", default=False, description="Also search notes in other node groups and materials")
+    line_separator         : StringProperty(name="Line Separator", default=";|\\", options={'TEXTEDIT_UPDATE'}, description="Line break separator in text, supports multiple (separated by |), e.g.: ;|\\", update=update_draw_settings)
+    use_markup             : BoolProperty(name="Rich Text", default=False, update=update_draw_settings, description="Parse **bold**, [red]color[/] and leading \"- \" bullets in text notes")
 
     hide_text_panel    : BoolProperty(name="Hide Text Panel", default=True, description="Default hide text note panel")
     hide_image_panel   : BoolProperty(name="Hide Image Panel", default=True, description="Default hide image note panel")
@@ -60,8 +83,8 @@ class NodeNoteAddonPreferences(AddonPreferences):
 
     # 2. 文本设置区
     default_font_size      : IntProperty(name="Default Font Size", default=8, min=4, max=100)
-    font_path              : StringProperty(default='', subtype='FILE_PATH', options={'TEXTEDIT_UPDATE'}, description="Font file path, leave empty to use default font")
-    bg_rect_roundness     : FloatProperty(name="Roundness", default=0.35, min=0, max=1, description="Roundness of note background rectangle")
+    font_path              : StringProperty(default='', subtype='FILE_PATH', options={'TEXTEDIT_UPDATE'}, description="Font file path, leave empty to use default font", update=update_draw_settings)
+    bg_rect_roundness     : FloatProperty(name="Roundness", default=0.35, min=0, max=1, description="Roundness of note background rectangle", update=update_draw_settings)
     default_text_color     : FloatVectorProperty(name="Default Text Color", subtype='COLOR', size=4, default=(1.0, 1.0, 1.0, 1.0), min=0, max=1)
     default_txt_bg_color   : FloatVectorProperty(name="Default Background Color", subtype='COLOR', size=4, default=(0.2, 0.3, 0.5, 0.9), min=0, max=1)
 
@@ -74,20 +97,20 @@ class NodeNoteAddonPreferences(AddonPreferences):
     default_img_pos        : EnumProperty(name="Default Alignment", items=align_items, default='TOP')
 
     default_badge_color    : FloatVectorProperty(name="Circle Background Color", subtype='COLOR', size=4, default=(0.8, 0.1, 0.1, 1.0), min=0, max=1)
-    badge_scale_mode       : EnumProperty(name="Scale Mode", items=badge_width_items, default='ABSOLUTE')
-    badge_rel_scale        : FloatProperty(name="Index Scale", default=1.0, min=0.1, max=20.0)
-    badge_abs_scale        : FloatProperty(name="Screen Space Scale", default=1.0, min=0.1, max=10.0)
-    badge_font_color       : FloatVectorProperty(name="Number Color", subtype='COLOR', size=4, default=(1.0, 1.0, 1.0, 1.0), min=0, max=1, description="Number color for all indexes")
-    badge_line_color       : FloatVectorProperty(name="Line Color", subtype='COLOR', size=4, default=(1.0, 0.8, 0.2, 0.8), min=0, max=1)
-    badge_line_thickness   : IntProperty(name="Line Width", default=4, min=1, max=40)
+    badge_scale_mode       : EnumProperty(name="Scale Mode", items=badge_width_items, default='ABSOLUTE', update=update_draw_settings)
+    badge_rel_scale        : FloatProperty(name="Index Scale", default=1.0, min=0.1, max=20.0, update=update_draw_settings)
+    badge_abs_scale        : FloatProperty(name="Screen Space Scale", default=1.0, min=0.1, max=10.0, update=update_draw_settings)
+    badge_font_color       : FloatVectorProperty(name="Number Color", subtype='COLOR', size=4, default=(1.0, 1.0, 1.0, 1.0), min=0, max=1, description="Number color for all indexes", update=update_draw_settings)
+    badge_line_color       : FloatVectorProperty(name="Line Color", subtype='COLOR', size=4, default=(1.0, 0.8, 0.2, 0.8), min=0, max=1, update=update_draw_settings)
+    badge_line_thickness   : IntProperty(name="Line Width", default=4, min=1, max=40, update=update_draw_settings)
 
     # 预设颜色
-    col_preset_1           : FloatVectorProperty(name="Preset Red", subtype='COLOR', size=4, default=(0.6, 0.1, 0.1, 0.9), min=0, max=1)
-    col_preset_2           : FloatVectorProperty(name="Preset Green", subtype='COLOR', size=4, default=(0.2, 0.5, 0.2, 0.9), min=0, max=1)
-    col_preset_3           : FloatVectorProperty(name="Preset Blue", subtype='COLOR', size=4, default=(0.2, 0.3, 0.5, 0.9), min=0, max=1)
-    col_preset_4           : FloatVectorProperty(name="Preset Orange", subtype='COLOR', size=4, default=(0.8, 0.35, 0.05, 0.9), min=0, max=1)
-    col_preset_5           : FloatVectorProperty(name="Preset Purple", subtype='COLOR', size=4, default=(0.4, 0.1, 0.5, 0.9), min=0, max=1)
-    col_preset_6           : FloatVectorProperty(name="Preset None", subtype='COLOR', size=4, default=(0.0, 0.0, 0.0, 0.0), min=0, max=1)
+    col_preset_1           : FloatVectorProperty(name="Preset Red", subtype='COLOR', size=4, default=(0.6, 0.1, 0.1, 0.9), min=0, max=1, update=update_draw_settings)
+    col_preset_2           : FloatVectorProperty(name="Preset Green", subtype='COLOR', size=4, default=(0.2, 0.5, 0.2, 0.9), min=0, max=1, update=update_draw_settings)
+    col_preset_3           : FloatVectorProperty(name="Preset Blue", subtype='COLOR', size=4, default=(0.2, 0.3, 0.5, 0.9), min=0, max=1, update=update_draw_settings)
+    col_preset_4           : FloatVectorProperty(name="Preset Orange", subtype='COLOR', size=4, default=(0.8, 0.35, 0.05, 0.9), min=0, max=1, update=update_draw_settings)
+    col_preset_5           : FloatVectorProperty(name="Preset Purple", subtype='COLOR', size=4, default=(0.4, 0.1, 0.5, 0.9), min=0, max=1, update=update_draw_settings)
+    col_preset_6           : FloatVectorProperty(name="Preset None", subtype='COLOR', size=4, default=(0.0, 0.0, 0.0, 0.0), min=0, max=1, update=update_draw_settings)
 
     label_preset_1         : StringProperty(name="Label 1", default="Red")
     label_preset_2         : StringProperty(name="Label 2", default="Green")
@@ -102,19 +125,14 @@ class NodeNoteAddonPreferences(AddonPreferences):
     show_badge       : BoolProperty(name="Show Index Notes", default=True)
     show_list        : BoolProperty(name="Show Notes List", default=True)
 
-    show_red             : BoolProperty(name="Show Red", default=True, description="Show by preset color")
-    show_green           : BoolProperty(name="Show Green", default=True, description="Show by preset color")
-    show_blue            : BoolProperty(name="Show Blue", default=True, description="Show by preset color")
-    show_orange          : BoolProperty(name="Show Orange", default=True, description="Show by preset color")
-    show_purple          : BoolProperty(name="Show Purple", default=True, description="Show by preset color")
-    show_other           : BoolProperty(name="Show Others", default=True, description="Show Others")
-    hide_img_by_bg       : BoolProperty(name="Also Filter Images", default=True, description="Filter images when filtering text")
+    category_mask        : IntProperty(name="Visible Categories", default=AllCategories, min=0, max=AllCategories, description="Bitmask of note categories to show, bit 0 = others", update=update_draw_settings)
+    category_count       : IntProperty(name="Categories", default=PresetCount, min=PresetCount, max=CategoryCount - 1, description="Number of note categories shown in the filter row, the first ones follow the color presets")
+    hide_img_by_bg       : BoolProperty(name="Also Filter Images", default=True, description="Filter images when filtering text", update=update_draw_settings)
 
     def draw(self, context):
         layout = self.layout
         layout.label(text="Plugin Location: Right-click Menu + NPanel->Node->Node Notes", icon='INFO')
-        layout.label(text="Saving v5.0+ files in v4.x results in missing notes when reopening in v5.x.", icon='WARNING_LARGE')
-        layout.label(text="Versions within 4.x are fully compatible. v5.0 can load notes saved in v4.x.", icon='CHECKMARK')
+        layout.label(text="Notes are stored as node custom properties, files can be exchanged between v4.x and v5.x.", icon='CHECKMARK')
         box = layout.box()
         row = box.row()
         row.label(text="Global", icon='WORLD_DATA')
@@ -126,6 +144,7 @@ class NodeNoteAddonPreferences(AddonPreferences):
         row_hide.prop(self, "hide_text_panel")
         row_hide.prop(self, "hide_image_panel")
         row_hide.prop(self, "hide_badge_panel")
+        row_hide.prop(self, "use_note_drag")
 
         wm = context.window_manager
         kc = wm.keyconfigs.user
@@ -143,8 +162,11 @@ class NodeNoteAddonPreferences(AddonPreferences):
         split1 = split.row()
         split1.prop(self, "panel_width", text="Shortcut Panel Width")
         split1.prop(self, "cursor_warp_x", text="Default Mouse Offset")
+        split1.prop(self, "list_page_size")
 
         layout.label(text="Some property changes require Blender restart to take effect", icon='INFO')
+        if context.preferences.view.show_developer_ui:
+            layout.label(text=f"Cache invalidations: {cache_manager.total_invalidations()} ({cache_manager.debug_report()})", icon='CONSOLE', translate=False)
 
         # region Text Notes
         txt_box = layout.box()
@@ -153,6 +175,7 @@ class NodeNoteAddonPreferences(AddonPreferences):
         split_txt = txt_box.split(factor=0.5)
         split_txt.prop(self, "default_font_size", text="Font Size")
         split_txt.prop(self, "font_path", text="Font")
+        txt_box.prop(self, "use_markup")
 
         split_color = txt_box.split(factor=0.33)
         split_color.row().prop(self, "default_text_color", text="Text Color")
@@ -177,6 +200,7 @@ class NodeNoteAddonPreferences(AddonPreferences):
         grid_label = split_preset.grid_flow(row_major=True, columns=6, align=True)
         for i in range(1, 7):
             grid_label.prop(self, f"label_preset_{i}", text="")
+        split_preset.prop(self, "category_count")
         # endregion
 
         # region Image Notes
@@ -216,3 +240,66 @@ class NodeNoteAddonPreferences(AddonPreferences):
 def pref() -> NodeNoteAddonPreferences:
     assert __package__ is not None
     return bpy.context.preferences.addons[__package__].preferences
+
+@dataclass(frozen=True)
+class DrawSettings:
+    """绘制用的偏好设置快照, 仅在相关设置的 update 回调触发后重建, 避免每节点每帧查找 pref()"""
+    show_all_notes: bool
+    show_selected_only: bool
+    dependent_overlay: bool
+    show_badge_lines: bool
+    hide_img_by_bg: bool
+    use_markup: bool
+    line_separator: str
+    font_path: str
+    bg_rect_roundness: float
+    badge_scale_mode: BadgeScaleMode
+    badge_rel_scale: float
+    badge_abs_scale: float
+    badge_font_color: RGBA
+    badge_line_color: RGBA
+    badge_line_thickness: int
+    category_mask: int
+    show_group_rollups: bool
+    category_colors: tuple[RGBA, ...]
+    """ 分类 0~6 的颜色, 0 为灰色, 其余取颜色预设 """
+
+    def visible_mask(self, categories: np.ndarray) -> np.ndarray:
+        """批量判断分类是否显示"""
+        return (self.category_mask >> np.clip(categories, 0, CategoryCount - 1)) & 1 == 1
+
+    def category_color(self, category: int) -> RGBA:
+        return self.category_colors[category if category < len(self.category_colors) else 0]
+
+_draw_settings: DrawSettings | None = None
+
+def invalidate_draw_settings() -> None:
+    global _draw_settings
+    _draw_settings = None
+
+def get_draw_settings() -> DrawSettings:
+    """获取绘制设置快照, 失效后首次调用时重建"""
+    global _draw_settings
+    if _draw_settings is None:
+        prefs = pref()
+        _draw_settings = DrawSettings(
+            show_all_notes=prefs.show_all_notes,
+            show_selected_only=prefs.show_selected_only,
+            dependent_overlay=prefs.dependent_overlay,
+            show_badge_lines=prefs.show_badge_lines,
+            hide_img_by_bg=prefs.hide_img_by_bg,
+            use_markup=prefs.use_markup,
+            line_separator=prefs.line_separator,
+            font_path=prefs.font_path,
+            bg_rect_roundness=prefs.bg_rect_roundness,
+            badge_scale_mode=prefs.badge_scale_mode,
+            badge_rel_scale=prefs.badge_rel_scale,
+            badge_abs_scale=prefs.badge_abs_scale,
+            badge_font_color=tuple(prefs.badge_font_color),
+            badge_line_color=tuple(prefs.badge_line_color),
+            badge_line_thickness=prefs.badge_line_thickness,
+            category_mask=prefs.category_mask,
+            show_group_rollups=prefs.show_group_rollups,
+            category_colors=(OthersColor, *((*getattr(prefs, f"col_preset_{i}")[:3], 1.0) for i in range(1, PresetCount + 1))),
+        )
+    return _draw_settings
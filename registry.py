@@ -0,0 +1,204 @@
+import bpy
+from dataclasses import dataclass, field
+from typing import Callable
+from bpy.types import Node, NodeTree
+from . import cache_manager
+from . import dirty
+from .note_data import NoteKey, UuidKey, DataVersionKey, has_note, has_legacy_note, new_uuid, note_uuid
+from .preferences import tag_redraw
+from .utils import iter_node_trees
+
+# 每个节点树中有笔记(文本/图片/序号)的节点登记表, 绘制和列表只遍历登记的节点
+# 由笔记属性的 update 回调增量维护; 复制/删除节点不会触发回调, 通过节点数量变化发现后整树重扫
+# 同时维护笔记标识 -> 节点名的映射, 导航/缓存用标识定位节点, 不受改名影响
+
+@dataclass
+class TreeEntry:
+    names: dict[str, int] = field(default_factory=dict)
+    """ 节点名 -> 上次所在下标(选择节点会改变顺序, 使用前校验) """
+    uuids: dict[str, str] = field(default_factory=dict)
+    """ 笔记标识 -> 节点名(改名后失效, 使用前校验) """
+    node_count: int = -1
+    """ 扫描时的节点数量 """
+
+_registry: dict[int, TreeEntry] = {}
+""" 节点树指针 -> 登记表 """
+_duplicate_trees: set[int] = set()
+""" 发现重复标识(复制/粘贴节点)等待重新分配的节点树 """
+_unmigrated_trees: set[int] = set()
+""" 从未迁移过, 或追加/粘贴进旧版数据的本地节点树 """
+_migrator: Callable[[NodeTree], None] | None = None
+""" 数据迁移函数, 由 node_properties 注册 """
+
+def set_migrator(migrate: Callable[[NodeTree], None] | None) -> None:
+    global _migrator
+    _migrator = migrate
+
+def _scan(tree: NodeTree) -> TreeEntry:
+    nodes = tree.nodes
+    tree_ptr = tree.as_pointer()
+    old = _registry.get(tree_ptr)
+    library = tree.library is not None
+    # 只检查可能带旧数据的节点: 从未迁移的节点树检查全部, 已迁移的只检查新增(粘贴的节点排在最后)
+    # 链接资产不能迁移, 旧版笔记直接登记, 由访问器回退读取旧存储
+    if library:
+        legacy_from = 0
+    elif DataVersionKey not in tree:
+        legacy_from = 0
+        _unmigrated_trees.add(tree_ptr)
+    else:
+        legacy_from = old.node_count if old is not None else len(nodes)
+    entry = TreeEntry(node_count=len(nodes))
+    for i, node in enumerate(nodes):
+        if NoteKey not in node:
+            if i < legacy_from or not has_legacy_note(node): continue
+            if not library:
+                _unmigrated_trees.add(tree_ptr)
+                continue
+        elif not has_note(node): continue
+        entry.names[node.name] = i
+        uid = note_uuid(node)
+        if not uid or uid in entry.uuids:
+            _duplicate_trees.add(tree.as_pointer())
+        else:
+            entry.uuids[uid] = node.name
+    _registry[tree_ptr] = entry
+    if _duplicate_trees and not bpy.app.timers.is_registered(_assign_duplicate_uuids):
+        # 绘制期间不能写入数据, 推迟到定时器中处理
+        bpy.app.timers.register(_assign_duplicate_uuids, first_interval=0)
+    if _unmigrated_trees and not bpy.app.timers.is_registered(_migrate_pending):
+        bpy.app.timers.register(_migrate_pending, first_interval=0)
+    return entry
+
+def _reindex(tree: NodeTree, entry: TreeEntry) -> bool:
+    """节点顺序变化后按名字重新定位下标, 有节点找不到(改名)时返回 False"""
+    name_to_index = {name: i for i, name in enumerate(tree.nodes.keys())}
+    for name in entry.names:
+        index = name_to_index.get(name)
+        if index is None:
+            return False
+        entry.names[name] = index
+    return True
+
+def _get_entry(tree: NodeTree) -> TreeEntry:
+    """登记表, 节点数量变化时重扫; 不校验下标"""
+    entry = _registry.get(tree.as_pointer())
+    if entry is None or entry.node_count != len(tree.nodes):
+        entry = _scan(tree)
+    return entry
+
+def noted_indices(tree: NodeTree) -> list[int]:
+    """有笔记节点在 tree.nodes 中的下标"""
+    nodes = tree.nodes
+    entry = _get_entry(tree)
+    # 选择节点会改变顺序, 绘制本来就要读取这些节点, 顺带校验下标
+    if any(nodes[i].name != name for name, i in entry.names.items()):
+        if not _reindex(tree, entry):
+            entry = _scan(tree)
+    return list(entry.names.values())
+
+def noted_nodes(tree: NodeTree) -> list[Node]:
+    """有笔记的节点, 按名字取得, 不依赖下标"""
+    nodes = tree.nodes
+    entry = _get_entry(tree)
+    result = [nodes.get(name) for name in entry.names]
+    if None in result:
+        # 有节点被改名, 重扫一次
+        entry = _scan(tree)
+        result = [nodes.get(name) for name in entry.names]
+    return result  # type: ignore
+
+def _lookup(tree: NodeTree, entry: TreeEntry, uid: str) -> Node | None:
+    name = entry.uuids.get(uid)
+    node = tree.nodes.get(name) if name is not None else None
+    if node is not None and note_uuid(node) == uid:
+        return node
+    return None
+
+def find_node(tree: NodeTree, uid: str) -> Node | None:
+    """按笔记标识查找节点, 命中时只读取一个节点"""
+    node = _lookup(tree, _get_entry(tree), uid)
+    if node is None:
+        # 节点可能被改名, 重扫后再找一次
+        node = _lookup(tree, _scan(tree), uid)
+    return node
+
+def locate_note(uid: str) -> tuple[NodeTree | None, Node | None]:
+    """在所有节点树中按笔记标识查找"""
+    for tree in iter_node_trees():
+        if uid in _get_entry(tree).uuids:
+            node = find_node(tree, uid)
+            if node is not None:
+                return tree, node
+    return None, None
+
+def assign_unique_uuids(tree: NodeTree) -> int:
+    """给缺少标识或标识重复的笔记重新分配, 已登记的节点保留原标识, 返回重新分配的数量"""
+    entry = _registry.get(tree.as_pointer())
+    known = entry.uuids if entry is not None else {}
+    noted = [node for node in tree.nodes if NoteKey in node]
+    seen: set[str] = set()
+    # 先让登记表中对应的节点认领标识, 复制出来的节点再换新
+    for node in noted:
+        uid = note_uuid(node)
+        if uid and known.get(uid) == node.name:
+            seen.add(uid)
+    count = 0
+    for node in noted:
+        uid = note_uuid(node)
+        if uid and (known.get(uid) == node.name or uid not in seen):
+            seen.add(uid)
+            continue
+        node[NoteKey][UuidKey] = new_uuid()
+        count += 1
+    if count:
+        _registry.pop(tree.as_pointer(), None)
+        dirty.mark_tree(tree)
+    return count
+
+def _assign_duplicate_uuids() -> None:
+    pending = set(_duplicate_trees)
+    _duplicate_trees.clear()
+    for tree in iter_node_trees():
+        if tree.as_pointer() in pending and not tree.library:
+            assign_unique_uuids(tree)
+
+def _migrate_pending() -> None:
+    pending = set(_unmigrated_trees)
+    _unmigrated_trees.clear()
+    if _migrator is None: return
+    migrated = 0
+    for tree in iter_node_trees():
+        if tree.as_pointer() in pending and not tree.library:
+            _migrator(tree)
+            _registry.pop(tree.as_pointer(), None)
+            dirty.mark_tree(tree)
+            migrated += 1
+    if migrated:
+        tag_redraw(None, bpy.context)
+
+def update_node(node: Node) -> None:
+    """笔记内容变化时更新所在节点树的登记"""
+    tree = node.id_data
+    entry = _registry.get(tree.as_pointer())
+    if entry is None: return
+    if has_note(node):
+        entry.names[node.name] = tree.nodes.find(node.name)
+        entry.uuids[note_uuid(node)] = node.name
+    else:
+        entry.names.pop(node.name, None)
+        entry.uuids.pop(note_uuid(node), None)
+
+def clear_registry() -> None:
+    _registry.clear()
+    _duplicate_trees.clear()
+    _unmigrated_trees.clear()
+
+def register() -> None:
+    cache_manager.register_cache("registry", clear_registry)
+
+def unregister() -> None:
+    cache_manager.unregister_cache("registry")
+    for timer in (_assign_duplicate_uuids, _migrate_pending):
+        if bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
@@ -0,0 +1,170 @@
+import bpy
+from collections import Counter
+from dataclasses import dataclass, field
+from bpy.types import NodeTree
+from .registry import noted_nodes
+from .utils import iter_node_trees, text_split_lines
+from .group_graph import group_children, graph_version
+from .preferences import tag_redraw
+from . import dirty
+from . import cache_manager
+
+# 节点组笔记汇总: 节点树自身的笔记数/分类/置顶笔记, 加上其中组节点引用的节点树的汇总, 显示在组节点上
+# 自身部分按 (节点数, 内容时间戳) 缓存, 只重新统计笔记内容有改动的节点树
+# 任意笔记内容或组节点关系变化后, 由定时器把可到达的节点树的自身部分重新相加; 绘制只读取上次的结果, 不访问嵌套节点树
+
+PinnedLength = 40
+""" 置顶笔记首行最多显示的字符数 """
+
+@dataclass
+class NoteRollup:
+    count: int = 0
+    categories: Counter[int] = field(default_factory=Counter)
+    """ 分类 -> 笔记数 """
+    pinned: str = ""
+    """ 置顶笔记的首行, 优先取节点树自身的 """
+
+    def top_categories(self, limit: int) -> list[int]:
+        return [category for category, _ in self.categories.most_common(limit)]
+
+PollInterval = 1.0
+""" 有文本块置顶笔记时定时检查其首行(文本块的修改不触发回调) """
+
+_own: dict[int, tuple[tuple[int, int], NoteRollup, str]] = {}
+""" 节点树指针 -> ((节点数, 内容时间戳), 自身笔记统计, 置顶笔记所用文本块名) """
+_rollups: dict[int, list[tuple[str, NoteRollup]]] = {}
+""" 编辑中的节点树指针 -> 上次计算的 (组节点名, 包含嵌套节点组的汇总), 绘制只读取这里 """
+_wanted: set[int] = set()
+""" 绘制时请求过汇总的编辑中的节点树 """
+_reached: dict[int, frozenset[int]] = {}
+""" 节点树指针 -> 可以到达的节点树 """
+_rollup_key: tuple[int, int] = (-1, -1)
+""" 计算时的 (内容时间戳, 节点组关系版本) """
+_trees: dict[int, NodeTree] = {}
+""" 本次计算中的节点树, 计算结束即丢弃 """
+_scheduled = False
+""" 已请求重新计算, 避免每帧重复注册定时器 """
+
+def _first_line(text: str) -> str:
+    lines = text_split_lines(text.strip())
+    line = lines[0] if lines else ""
+    return line if len(line) <= PinnedLength else line[:PinnedLength - 1] + "…"
+
+def _text_block_line(name: str) -> str:
+    text_block = bpy.data.texts.get(name)
+    return _first_line(text_block.lines[0].body) if text_block is not None and len(text_block.lines) else ""
+
+def _own_notes(tree: NodeTree) -> NoteRollup:
+    tree_ptr = tree.as_pointer()
+    key = (len(tree.nodes), dirty.content_stamp(tree_ptr))
+    cached = _own.get(tree_ptr)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    own = NoteRollup()
+    text_name = ""
+    for node in noted_nodes(tree):
+        own.count += 1
+        own.categories[node.note_category] += 1  # type: ignore
+        if own.pinned or not node.note_pinned: continue  # type: ignore
+        text_block = node.note_text_block  # type: ignore
+        if node.note_text:  # type: ignore
+            own.pinned = _first_line(node.note_text)  # type: ignore
+        elif text_block is not None and (line := _text_block_line(text_block.name)):
+            text_name = text_block.name
+            own.pinned = line
+    _own[tree_ptr] = (key, own, text_name)
+    return own
+
+def _reachable(tree: NodeTree, visiting: set[int]) -> frozenset[int]:
+    """tree 及其中组节点(递归)引用的所有节点树, 同一节点组经多条路径引用时只算一次"""
+    tree_ptr = tree.as_pointer()
+    reached = _reached.get(tree_ptr)
+    if reached is not None:
+        return reached
+    result = {tree_ptr}
+    visiting.add(tree_ptr)
+    for _, child_ptr in group_children(tree):
+        child = _trees.get(child_ptr)
+        if child is None or child_ptr in visiting or child_ptr in result: continue
+        result |= _reachable(child, visiting)
+    visiting.discard(tree_ptr)
+    reached = _reached[tree_ptr] = frozenset(result)
+    return reached
+
+def _merge(tree: NodeTree) -> NoteRollup:
+    tree_ptr = tree.as_pointer()
+    rollup = NoteRollup()
+    for reached_ptr in _reachable(tree, set()):
+        own = _own_notes(_trees[reached_ptr])
+        rollup.count += own.count
+        rollup.categories.update(own.categories)
+        if own.pinned and (not rollup.pinned or reached_ptr == tree_ptr):
+            rollup.pinned = own.pinned
+    return rollup
+
+def _current_key() -> tuple[int, int]:
+    return dirty.content_generation(), graph_version()
+
+def _schedule() -> None:
+    if bpy.app.timers.is_registered(_recompute):
+        # 正在按 PollInterval 轮询时提前到下一次事件循环
+        bpy.app.timers.unregister(_recompute)
+    bpy.app.timers.register(_recompute, first_interval=0)
+
+def group_rollups(tree_ptr: int) -> list[tuple[str, NoteRollup]]:
+    """绘制用: 只读取上次计算的各组节点汇总(只含有笔记的), 过期或还没有时由定时器重新计算后重绘"""
+    global _scheduled
+    _wanted.add(tree_ptr)
+    if not _scheduled and (_rollup_key != _current_key() or tree_ptr not in _rollups):
+        _scheduled = True
+        _schedule()
+    return _rollups.get(tree_ptr, [])
+
+def _tree_rollups(tree: NodeTree) -> list[tuple[str, NoteRollup]]:
+    result = []
+    for name, child_ptr in group_children(tree):
+        child = _trees.get(child_ptr)
+        if child is None: continue
+        rollup = _merge(child)
+        if rollup.count:
+            result.append((name, rollup))
+    return result
+
+def _recompute() -> float | None:
+    """在定时器中合并汇总: 只重新统计内容有变化的节点树, 以及置顶文本块首行变化的节点树"""
+    global _rollups, _rollup_key, _trees, _scheduled
+    _scheduled = False
+    if _rollup_key != _current_key():
+        _reached.clear()
+    _trees = {tree.as_pointer(): tree for tree in iter_node_trees()}
+    for tree_ptr, (_, own, text_name) in list(_own.items()):
+        if tree_ptr not in _trees or (text_name and _text_block_line(text_name) != own.pinned):
+            del _own[tree_ptr]
+    try:
+        rollups = {tree_ptr: _tree_rollups(_trees[tree_ptr]) for tree_ptr in _wanted if tree_ptr in _trees}
+    finally:
+        _trees = {}
+    _wanted.intersection_update(rollups)
+    # 首次扫描节点组关系也会增加版本号, 合并完成后再记录
+    _rollup_key = _current_key()
+    if rollups != _rollups:
+        _rollups = rollups
+        tag_redraw(None, bpy.context)
+    return PollInterval if any(text_name for _, _, text_name in _own.values()) else None
+
+def clear_rollups() -> None:
+    global _rollup_key, _rollups, _scheduled
+    _own.clear()
+    _rollups = {}
+    _wanted.clear()
+    _reached.clear()
+    _scheduled = False
+    _rollup_key = (-1, -1)
+
+def register() -> None:
+    cache_manager.register_cache("rollups", clear_rollups)
+
+def unregister() -> None:
+    cache_manager.unregister_cache("rollups")
+    if bpy.app.timers.is_registered(_recompute):
+        bpy.app.timers.unregister(_recompute)
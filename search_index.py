@@ -0,0 +1,198 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from bpy.types import Node
+from .registry import noted_nodes
+from .note_data import note_uuid
+from .utils import iter_node_trees
+from . import dirty
+from . import cache_manager
+
+# 所有节点树笔记文本的倒排索引: 词 -> 笔记, 三元组 -> 笔记, 标签(#xxx) -> 笔记
+# 由笔记文本的 update 回调增量更新; 复制/删除节点等不经过回调的变化, 查询前按节点树的节点数和时间戳发现后整树重建
+# 查询词之间为"与"关系, 每个词按 完整词 > 前缀 > 子串 > 模糊(三元组重合率) 计分, 结果按总分排序
+
+_token_pattern = re.compile(r"\w+")
+_tag_pattern = re.compile(r"#(\w+)")
+
+ExactScore = 4.0
+PrefixScore = 3.0
+SubstringScore = 2.0
+FuzzyScore = 1.0
+""" 模糊匹配得分再乘以三元组重合率 """
+FuzzyThreshold = 0.5
+""" 查询词的三元组至少有这么多比例出现在笔记中才算模糊匹配 """
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+@dataclass(frozen=True)
+class NoteDoc:
+    tree_ptr: int
+    uid: str
+    text: str
+    """ 小写文本 """
+    tokens: frozenset[str]
+    tags: frozenset[str]
+
+@dataclass(frozen=True)
+class SearchHit:
+    tree_ptr: int
+    uid: str
+    score: float
+
+class SearchIndex:
+    def __init__(self):
+        self.docs: dict[int, NoteDoc] = {}
+        self.doc_ids: dict[tuple[int, str], int] = {}
+        """ (节点树指针, 笔记标识) -> 文档号 """
+        self.tokens: dict[str, set[int]] = {}
+        self.trigrams: dict[str, set[int]] = {}
+        self.tags: dict[str, set[int]] = {}
+        self.tree_docs: dict[int, set[int]] = {}
+        self.tree_versions: dict[int, tuple[int, int]] = {}
+        """ 节点树指针 -> 建索引时的 (节点数, 时间戳) """
+        self._vocabulary: list[str] | None = None
+        """ 排序后的词表, 前缀查询时按需重建 """
+        self._next_id = 0
+
+    @staticmethod
+    def _post(postings: dict[str, set[int]], keys, doc_id: int) -> None:
+        for key in keys:
+            postings.setdefault(key, set()).add(doc_id)
+
+    @staticmethod
+    def _unpost(postings: dict[str, set[int]], keys, doc_id: int) -> None:
+        for key in keys:
+            ids = postings.get(key)
+            if ids is None: continue
+            ids.discard(doc_id)
+            if not ids:
+                del postings[key]
+
+    def add(self, tree_ptr: int, uid: str, text: str) -> None:
+        self.remove(tree_ptr, uid)
+        text = text.strip().lower()
+        if not text or not uid: return
+        doc_id = self._next_id
+        self._next_id += 1
+        tokens = frozenset(_token_pattern.findall(text))
+        doc = NoteDoc(tree_ptr, uid, text, tokens, frozenset(_tag_pattern.findall(text)))
+        self.docs[doc_id] = doc
+        self.doc_ids[(tree_ptr, uid)] = doc_id
+        self.tree_docs.setdefault(tree_ptr, set()).add(doc_id)
+        if not tokens.issubset(self.tokens):
+            self._vocabulary = None
+        self._post(self.tokens, tokens, doc_id)
+        self._post(self.trigrams, _trigrams(text), doc_id)
+        self._post(self.tags, doc.tags, doc_id)
+
+    def remove(self, tree_ptr: int, uid: str) -> None:
+        doc_id = self.doc_ids.pop((tree_ptr, uid), None)
+        if doc_id is None: return
+        doc = self.docs.pop(doc_id)
+        self.tree_docs[tree_ptr].discard(doc_id)
+        self._unpost(self.tokens, doc.tokens, doc_id)
+        self._unpost(self.trigrams, _trigrams(doc.text), doc_id)
+        self._unpost(self.tags, doc.tags, doc_id)
+        self._vocabulary = None
+
+    def remove_tree(self, tree_ptr: int) -> None:
+        for doc_id in list(self.tree_docs.get(tree_ptr, ())):
+            self.remove(tree_ptr, self.docs[doc_id].uid)
+        self.tree_docs.pop(tree_ptr, None)
+        self.tree_versions.pop(tree_ptr, None)
+
+    def _prefixed(self, postings: dict[str, set[int]], prefix: str, vocabulary: list[str]) -> dict[int, float]:
+        """以 prefix 开头的词命中的文档, 完整匹配得分更高"""
+        scores: dict[int, float] = {}
+        for i in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            word = vocabulary[i]
+            if not word.startswith(prefix): break
+            score = ExactScore if word == prefix else PrefixScore
+            for doc_id in postings.get(word, ()):
+                if scores.get(doc_id, 0) < score:
+                    scores[doc_id] = score
+        return scores
+
+    def _term_scores(self, term: str, candidates: set[int] | None) -> dict[int, float]:
+        if term.startswith("#"):
+            return self._prefixed(self.tags, term[1:], sorted(self.tags))
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.tokens)
+        scores = self._prefixed(self.tokens, term, self._vocabulary)
+        if len(term) < 3:
+            # 太短没有三元组, 直接在候选中找子串
+            pool = candidates if candidates is not None else self.docs.keys()
+            for doc_id in pool:
+                if doc_id not in scores and term in self.docs[doc_id].text:
+                    scores[doc_id] = SubstringScore
+            return scores
+        term_grams = _trigrams(term)
+        counts: Counter[int] = Counter()
+        for gram in term_grams:
+            counts.update(self.trigrams.get(gram, ()))
+        for doc_id, count in counts.items():
+            if doc_id in scores: continue
+            if count == len(term_grams) and term in self.docs[doc_id].text:
+                scores[doc_id] = SubstringScore
+            elif count / len(term_grams) >= FuzzyThreshold:
+                scores[doc_id] = FuzzyScore * count / len(term_grams)
+        return scores
+
+    def search(self, query: str, tree_ptr: int | None = None) -> list[SearchHit]:
+        """查询词以空格分隔, #开头为标签; 指定 tree_ptr 时只返回该节点树中的结果"""
+        terms = query.lower().split()
+        if not terms: return []
+        candidates: set[int] | None = set(self.tree_docs.get(tree_ptr, ())) if tree_ptr is not None else None
+        totals: dict[int, float] = {}
+        for term in terms:
+            scores = self._term_scores(term, candidates)
+            matched = scores.keys() if candidates is None else candidates.intersection(scores)
+            candidates = set(matched)
+            totals = {doc_id: totals.get(doc_id, 0) + scores[doc_id] for doc_id in candidates}
+            if not candidates: return []
+        hits = [SearchHit(self.docs[doc_id].tree_ptr, self.docs[doc_id].uid, score) for doc_id, score in totals.items()]
+        hits.sort(key=lambda hit: -hit.score)
+        return hits
+
+_index = SearchIndex()
+
+def _tree_version(tree) -> tuple[int, int]:
+    return len(tree.nodes), dirty.tree_stamp(tree.as_pointer())
+
+def sync_index() -> None:
+    """重建新增/有结构变化的节点树, 移除已不存在的节点树"""
+    present: set[int] = set()
+    for tree in iter_node_trees():
+        tree_ptr = tree.as_pointer()
+        present.add(tree_ptr)
+        version = _tree_version(tree)
+        if _index.tree_versions.get(tree_ptr) == version: continue
+        _index.remove_tree(tree_ptr)
+        for node in noted_nodes(tree):
+            _index.add(tree_ptr, note_uuid(node), node.note_text)  # type: ignore
+        _index.tree_versions[tree_ptr] = version
+    for tree_ptr in set(_index.tree_versions) - present:
+        _index.remove_tree(tree_ptr)
+
+def search_notes(query: str, tree_ptr: int | None = None) -> list[SearchHit]:
+    sync_index()
+    return _index.search(query, tree_ptr)
+
+def update_node(node: Node) -> None:
+    """笔记文本变化时更新索引, 未建索引的节点树等查询时再整树建立"""
+    tree_ptr = node.id_data.as_pointer()
+    if tree_ptr in _index.tree_versions:
+        _index.add(tree_ptr, note_uuid(node), node.note_text)  # type: ignore
+
+def clear_index() -> None:
+    global _index
+    _index = SearchIndex()
+
+def register() -> None:
+    cache_manager.register_cache("search_index", clear_index)
+
+def unregister() -> None:
+    cache_manager.unregister_cache("search_index")
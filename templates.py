@@ -0,0 +1,264 @@
+import bpy
+import re
+import numpy as np
+from bpy.types import Node, NodeTree, NodeSocket
+from .layout import LRUCache
+from . import dirty
+from . import cache_manager
+from .note_data import note_uuid
+from .registry import find_node, noted_nodes
+from .preferences import tag_redraw
+from .utils import iter_node_trees
+
+# 笔记模板变量: {node.name} {node.label} {tree.name} {input:Count} {output:Value}, {{ 和 }} 为字面大括号
+# 模板按文本编译一次并缓存; 渲染结果按节点缓存, 绘制时只读取缓存, 编译和求值都在回调/定时器中进行
+# 依赖图更新只重新求值读取被修改节点(活动/选中节点)的模板, 以及读取节点树属性的模板
+
+_field_pattern = re.compile(r"\{\{|\}\}|\{(node|tree|input|output)[.:]([^{}]+)\}")
+_attr_pattern = re.compile(r"[A-Za-z][A-Za-z0-9_]*")
+
+_compiled_cache = LRUCache(512)
+_rendered: dict[int, dict[str, tuple[str, str, str]]] = {}
+""" 节点树指针 -> 笔记标识 -> (节点名, 模板源文本, 渲染结果) """
+_readers: dict[int, dict[str, set[str]]] = {}
+""" 节点树指针 -> 节点名 -> 读取该节点的模板笔记标识 """
+_tree_readers: dict[int, set[str]] = {}
+""" 节点树指针 -> 读取 {tree.xxx} 的模板笔记标识, 节点树的任何更新都要重新求值 """
+_pending: set[tuple[int, str]] = set()
+""" 绘制时缺少渲染结果的 (节点树指针, 笔记标识) """
+_stale_trees: set[int] = set()
+""" 依赖图报告有更新的节点树 """
+_prerender = False
+""" 加载/撤销后在定时器中渲染全部模板 """
+
+Template = tuple[str | tuple[str, str, str], ...]
+""" 字面文本 或 (类型, 名称, 原始占位符) """
+
+def compile_template(text: str) -> Template | None:
+    """将文本编译为模板片段, 不含变量时返回 None"""
+    if "{" not in text and "}" not in text:
+        return None
+    cached = _compiled_cache.get(text)
+    if cached is not None:
+        return cached or None
+
+    parts: list[str | tuple[str, str, str]] = []
+    has_field = False
+    pos = 0
+    for match in _field_pattern.finditer(text):
+        if match.start() > pos:
+            parts.append(text[pos:match.start()])
+        token = match.group(0)
+        if token in {"{{", "}}"}:
+            parts.append(token[0])
+        else:
+            parts.append((match.group(1), match.group(2).strip(), token))
+            has_field = True
+        pos = match.end()
+    if pos < len(text):
+        parts.append(text[pos:])
+    template: Template = tuple(parts) if has_field else ()
+    _compiled_cache.put(text, template)
+    return template or None
+
+def _format_value(value) -> str:
+    if isinstance(value, bool) or value is None:
+        return str(value)
+    if isinstance(value, float):
+        return f"{value:.3g}"
+    if isinstance(value, (int, str)):
+        return str(value)
+    if isinstance(value, bpy.types.ID):
+        return value.name
+    try:
+        return "(" + ", ".join(_format_value(v) for v in value) + ")"
+    except TypeError:
+        return str(value)
+
+def _socket_value(sockets, name: str) -> str | None:
+    socket: NodeSocket | None = sockets.get(name)
+    if socket is None and name.isdigit() and int(name) < len(sockets):
+        socket = sockets[int(name)]
+    if socket is None:
+        return None
+    if not socket.is_output and socket.is_linked:
+        return "—"
+    if not hasattr(socket, "default_value"):
+        return ""
+    return _format_value(socket.default_value)
+
+def _eval_field(node: Node, kind: str, name: str) -> str | None:
+    if kind == "input":
+        return _socket_value(node.inputs, name)
+    if kind == "output":
+        return _socket_value(node.outputs, name)
+    if not _attr_pattern.fullmatch(name):
+        return None
+    owner = node if kind == "node" else node.id_data
+    if not hasattr(owner, name):
+        return None
+    return _format_value(getattr(owner, name))
+
+def render_template(node: Node, template: Template) -> str:
+    parts: list[str] = []
+    for part in template:
+        if isinstance(part, str):
+            parts.append(part)
+            continue
+        kind, name, token = part
+        value = _eval_field(node, kind, name)
+        parts.append(token if value is None else value)
+    return "".join(parts)
+
+def _render_and_store(node: Node, text: str, template: Template) -> str:
+    rendered = render_template(node, template)
+    tree_ptr = node.id_data.as_pointer()
+    uid = note_uuid(node)
+    old = _rendered.setdefault(tree_ptr, {}).get(uid)
+    if old is not None and old[0] != node.name:
+        _forget_reader(tree_ptr, old[0], uid)
+    _rendered[tree_ptr][uid] = (node.name, text, rendered)
+    _readers.setdefault(tree_ptr, {}).setdefault(node.name, set()).add(uid)
+    if any(not isinstance(part, str) and part[0] == "tree" for part in template):
+        _tree_readers.setdefault(tree_ptr, set()).add(uid)
+    return rendered
+
+def _forget_reader(tree_ptr: int, name: str, uid: str) -> None:
+    uids = _readers.get(tree_ptr, {}).get(name)
+    if uids is not None:
+        uids.discard(uid)
+        if not uids:
+            del _readers[tree_ptr][name]
+
+def _forget(tree_ptr: int, uid: str) -> None:
+    entry = _rendered.get(tree_ptr, {}).pop(uid, None)
+    if entry is not None:
+        _forget_reader(tree_ptr, entry[0], uid)
+    _tree_readers.get(tree_ptr, set()).discard(uid)
+
+def _source_text(node: Node) -> str:
+    text_block = node.note_text_block  # type: ignore
+    return text_block.as_string() if text_block else node.note_text  # type: ignore
+
+def _schedule() -> None:
+    if not bpy.app.timers.is_registered(_render_pending):
+        bpy.app.timers.register(_render_pending, first_interval=0)
+
+def display_text(node: Node, text: str) -> str:
+    """绘制用文本: 只读取缓存的渲染结果, 没有时先显示原文, 由定时器渲染后重绘"""
+    if "{" not in text and "}" not in text:
+        return text
+    tree_ptr = node.id_data.as_pointer()
+    uid = note_uuid(node)
+    entry = _rendered.get(tree_ptr, {}).get(uid)
+    if entry is not None and entry[1] == text:
+        return entry[2]
+    _pending.add((tree_ptr, uid))
+    _schedule()
+    return text
+
+def refresh_node(node: Node) -> None:
+    """笔记文本变化时重新求值"""
+    text: str = node.note_text  # type: ignore
+    template = compile_template(text)
+    if template is None:
+        _forget(node.id_data.as_pointer(), note_uuid(node))
+    else:
+        _render_and_store(node, text, template)
+
+def _render_nodes(tree: NodeTree, uids) -> int:
+    """重新求值 tree 中指定笔记的模板, 返回结果有变化的数量"""
+    tree_ptr = tree.as_pointer()
+    changed = 0
+    for uid in list(uids):
+        node = find_node(tree, uid)
+        text = _source_text(node) if node is not None else ""
+        template = compile_template(text)
+        if template is None:
+            _forget(tree_ptr, uid)
+            continue
+        old = _rendered.get(tree_ptr, {}).get(uid)
+        rendered = _render_and_store(node, text, template)  # type: ignore
+        if old is None or old[1:] != (text, rendered):
+            dirty.mark_note(tree_ptr, uid)
+            changed += 1
+    return changed
+
+def _touched_readers(tree: NodeTree) -> set[str]:
+    """依赖图只报告节点树有更新, 按活动/选中节点推断被修改的节点, 只重新求值读取这些节点的模板"""
+    tree_ptr = tree.as_pointer()
+    readers = _readers.get(tree_ptr)
+    uids = set(_tree_readers.get(tree_ptr, ()))
+    if not readers: return uids
+    nodes = tree.nodes
+    select = np.zeros(len(nodes), dtype=bool)
+    nodes.foreach_get("select", select)
+    touched = [nodes[i] for i in np.flatnonzero(select).tolist()]
+    if nodes.active is not None:
+        touched.append(nodes.active)
+    entries = _rendered.get(tree_ptr, {})
+    for node in touched:
+        uids.update(readers.get(node.name, ()))
+        # 改名后按旧名登记的模板也要找到
+        uid = note_uuid(node)
+        if uid in entries:
+            uids.add(uid)
+    return uids
+
+def _render_pending() -> None:
+    """渲染绘制时缺失的模板(加载/撤销后, 文本块内容变化)和依赖图更新涉及的模板"""
+    global _prerender
+    trees = {tree.as_pointer(): tree for tree in iter_node_trees()}
+    changed = 0
+    if _prerender:
+        _prerender = False
+        for tree in trees.values():
+            texts = {note_uuid(node): _source_text(node) for node in noted_nodes(tree)}
+            changed += _render_nodes(tree, [uid for uid, text in texts.items() if "{" in text or "}" in text])
+    for tree_ptr in list(_stale_trees):
+        tree = trees.get(tree_ptr)
+        if tree is not None:
+            changed += _render_nodes(tree, _touched_readers(tree))
+    _stale_trees.clear()
+    pending: dict[int, list[str]] = {}
+    for tree_ptr, uid in _pending:
+        pending.setdefault(tree_ptr, []).append(uid)
+    _pending.clear()
+    for tree_ptr, uids in pending.items():
+        tree = trees.get(tree_ptr)
+        if tree is not None:
+            changed += _render_nodes(tree, uids)
+    if changed:
+        tag_redraw(None, bpy.context)
+
+def _on_depsgraph_update(depsgraph) -> int:
+    if not _rendered: return 0
+    count = 0
+    for update in depsgraph.updates:
+        id_data = update.id.original
+        tree = id_data if isinstance(id_data, NodeTree) else getattr(id_data, "node_tree", None)
+        if tree is not None and tree.as_pointer() in _rendered:
+            _stale_trees.add(tree.as_pointer())
+            count += 1
+    if count:
+        _schedule()
+    return count
+
+def clear_rendered() -> None:
+    """撤销/重做/加载文件后指针失效, 清空后在定时器中重新渲染全部模板"""
+    global _prerender
+    _rendered.clear()
+    _readers.clear()
+    _tree_readers.clear()
+    _pending.clear()
+    _stale_trees.clear()
+    _prerender = True
+    _schedule()
+
+def register() -> None:
+    cache_manager.register_cache("templates", clear_rendered, _on_depsgraph_update)
+
+def unregister() -> None:
+    cache_manager.unregister_cache("templates")
+    if bpy.app.timers.is_registered(_render_pending):
+        bpy.app.timers.unregister(_render_pending)
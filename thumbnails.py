@@ -0,0 +1,132 @@
+import bpy
+import bpy.utils.previews
+import numpy as np
+from bpy.types import Image, Depsgraph
+from .preferences import tag_redraw
+from . import cache_manager
+
+# 笔记列表用的小缩略图: 插件自己的预览集合, 展开列表项时才生成
+# 用 NumPy 对像素下采样, 避免 template_ID_preview 为文件中每张图片生成并常驻大尺寸预览
+# 面板绘制时只排队, 由定时器每次生成一张; 过大的图片只显示占位图标
+# 按 (图片指针, 更新计数) 缓存, 图片被编辑/重新加载后计数加一, 下次绘制时重新生成
+
+ThumbSize = 64
+""" 缩略图长边像素 """
+MaxPixels = 2048 * 2048
+""" 超过这个像素数的图片不生成缩略图, 避免读取全尺寸浮点像素时的内存峰值 """
+
+_previews: bpy.utils.previews.ImagePreviewCollection | None = None
+_keys: dict[int, str] = {}
+""" 图片指针 -> 当前缩略图键 """
+_update_counts: dict[int, int] = {}
+""" 图片指针 -> 更新计数 """
+_pending: dict[int, str] = {}
+""" 等待生成的 图片指针 -> 缩略图键 """
+_skipped: set[str] = set()
+""" 过大或无法读取像素的缩略图键, 不再重试 """
+
+def _downsample(image: Image) -> tuple[int, int, np.ndarray] | None:
+    """最近邻下采样到长边 ThumbSize 的 RGBA 像素"""
+    width, height = image.size
+    channels = image.channels
+    if width == 0 or height == 0 or channels == 0:
+        return None
+    pixels = np.empty(width * height * channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(height, width, channels)
+    factor = min(1.0, ThumbSize / max(width, height))
+    thumb_w, thumb_h = max(1, round(width * factor)), max(1, round(height * factor))
+    ys = ((np.arange(thumb_h) + 0.5) * height / thumb_h).astype(np.intp)
+    xs = ((np.arange(thumb_w) + 0.5) * width / thumb_w).astype(np.intp)
+    thumb = pixels[ys[:, None], xs[None, :]]
+    if channels < 3:
+        thumb = np.concatenate([np.repeat(thumb[..., :1], 3, axis=2), thumb[..., 1:]], axis=2)
+    if thumb.shape[2] == 3:
+        thumb = np.concatenate([thumb, np.ones((thumb_h, thumb_w, 1), dtype=np.float32)], axis=2)
+    return thumb_w, thumb_h, np.ascontiguousarray(thumb).ravel()
+
+def _key(ptr: int) -> str:
+    return f"{ptr}_{_update_counts.get(ptr, 0)}"
+
+def thumbnail_icon(image: Image) -> int:
+    """图片缩略图的 icon_value; 还没生成时排队并返回 0, 无法生成(过大等)也返回 0"""
+    if _previews is None: return 0
+    ptr = image.as_pointer()
+    key = _key(ptr)
+    preview = _previews.get(key)
+    if preview is not None:
+        return preview.icon_id
+    if key not in _skipped:
+        _pending[ptr] = key
+        if not bpy.app.timers.is_registered(_generate_next):
+            bpy.app.timers.register(_generate_next, first_interval=0)
+    return 0
+
+def _generate(image: Image, key: str) -> bool:
+    width, height = image.size
+    if width * height > MaxPixels:
+        return False
+    try:
+        result = _downsample(image)
+    except (RuntimeError, ValueError):
+        result = None
+    if result is None or _previews is None:
+        return False
+    ptr = image.as_pointer()
+    old_key = _keys.pop(ptr, None)
+    if old_key is not None and old_key in _previews:
+        del _previews[old_key]
+    thumb_w, thumb_h, pixels = result
+    preview = _previews.new(key)
+    preview.image_size = (thumb_w, thumb_h)
+    preview.image_pixels_float.foreach_set(pixels)
+    _keys[ptr] = key
+    return True
+
+def _generate_next() -> float | None:
+    """面板绘制时只排队, 每次定时器回调生成一张, 生成后重绘"""
+    while _pending:
+        ptr, key = _pending.popitem()
+        if key != _key(ptr): continue
+        image = next((image for image in bpy.data.images if image.as_pointer() == ptr), None)
+        if image is None: continue
+        if _generate(image, key):
+            tag_redraw(None, bpy.context)
+        else:
+            _skipped.add(key)
+        break
+    return 0.0 if _pending else None
+
+def _on_depsgraph_update(depsgraph: Depsgraph) -> int:
+    if not _keys and not _skipped: return 0
+    count = 0
+    for update in depsgraph.updates:
+        if isinstance(update.id, Image):
+            ptr = update.id.original.as_pointer()
+            # 跳过的图片编辑(缩小)后也可以重新尝试
+            if ptr in _keys or _key(ptr) in _skipped:
+                _update_counts[ptr] = _update_counts.get(ptr, 0) + 1
+                count += 1
+    return count
+
+def clear_thumbnails() -> None:
+    if _previews is not None:
+        _previews.clear()
+    _keys.clear()
+    _update_counts.clear()
+    _pending.clear()
+    _skipped.clear()
+
+def register() -> None:
+    global _previews
+    _previews = bpy.utils.previews.new()
+    cache_manager.register_cache("thumbnails", clear_thumbnails, _on_depsgraph_update)
+
+def unregister() -> None:
+    global _previews
+    cache_manager.unregister_cache("thumbnails")
+    if bpy.app.timers.is_registered(_generate_next):
+        bpy.app.timers.unregister(_generate_next)
+    if _previews is not None:
+        bpy.utils.previews.remove(_previews)
+        _previews = None
@@ -1,6 +1,8 @@
 translations_dict = {
     "zh_HANS": {
         ("Operator", "Swap Text and Image Position"): "交换图文位置",
+        ("*", "Text Block"): "文本块",
+        ("*", "Use a text datablock as long-form note body"): "使用文本数据块作为长文本笔记正文",
         ("Operator", "Delete Text (Multi-Select)"): "删除文本(多选)",
         ("Operator", "Delete Index (Multi-Select)"): "删除序号(多选)",
         ("Operator", "Remove Image (Multi-Select)"): "移除图片(多选)",
@@ -74,7 +76,9 @@ translations_dict = {
         ("*", "External images will be packed into Blend file"): "外部图片将打包到Blend文件",
         ("*", "Images will be unpacked to original or current directory"): "将图片将解包到原始目录或当前目录",
         ("*", "Please save Blend file first"): "请先保存Blend文件",
-        ("*", "Jump to the node containing the note"): "跳转到笔记对应的节点",
+        ("*", "Jump to the node containing the note, entering nested node groups if needed"): "跳转到笔记对应的节点, 必要时进入嵌套的节点组",
+        ("*", "The note is not inside a node group reachable from the current node tree"): "笔记所在的节点组无法从当前节点树进入",
+        ("*", "bpy.data collection of the ID owning the target node tree, empty for the current tree"): "目标节点树所属 ID 所在的 bpy.data 集合, 为空表示当前节点树",
         ("*", "View image in floating image editor"): "在浮动的图像编辑器中查看图片",
         ("*", "External images"): "外部图片",
         ("*", "Already packed"): "已打包",
@@ -88,14 +92,22 @@ translations_dict = {
         ("*", "Interactive Mode [Right-click/ESC to exit] | Market: {node_name} -> #{index}"):
         "交互式编号模式 [右键/ESC退出] | 已标记: {node_name} -> #{index}",
         ("*", "Interactive Mode [Right-click/ESC to exit] | Current max index: #{max_idx}"): "交互式编号模式 [右键/ESC退出] | 当前最大序号: #{max_idx}",
-        ("*", "Show text by background color:"): "按文本背景色显示文本:",
-        ("*", "Show text and images by background color:"): "按文本背景色显示文本和图片:",
+        ("*", "Show text by category:"): "按分类显示文本:",
+        ("*", "Show text and images by category:"): "按分类显示文本和图片:",
+        ("*", "Category"): "分类",
+        ("*", "Categories"): "分类数",
+        ("*", "Note category for visibility filtering, 1-6 follow the color presets, 0 = others"): "用于显示过滤的笔记分类, 1~6 对应颜色预设, 0 为其余",
+        ("*", "Number of note categories shown in the filter row, the first ones follow the color presets"): "过滤行中显示的分类数量, 前几个对应颜色预设",
+        ("*", "Toggle Category Visibility"): "切换分类显示",
+        ("*", "Show or hide notes of this category"): "显示或隐藏此分类的笔记",
         ("*", "List ({count})"): "列表 ({count})",
         ("*", "Node:  {name}"): "节点:  {name}",
         ("*", "Image:  {name}"): "图片:  {name}",
         ("*", "Others"): "其余",
         ("*", "Font Size"): "字号",
         ("*", "Line Separator"): "换行符",
+        ("*", "Rich Text"): "富文本",
+        ("*", "Parse **bold**, [red]color[/] and leading \"- \" bullets in text notes"): "解析文本笔记中的 **粗体**、[red]颜色[/] 和行首 \"- \" 列表",
         ("*", "Background:"): "背景:",
         ("*", "Center"): "居中",
         ("*", "Global Index Settings:"): "序号全局设置:",
@@ -108,6 +120,22 @@ translations_dict = {
         ("*", "Active node required"): "需要活动节点",
         ("*", "No matching items found"): "未找到匹配项",
         ("*", "No notes yet"): "暂无注记",
+        ("Operator", "Drag Note"): "拖动笔记",
+        ("*", "Drag Notes"): "拖动笔记",
+        ("*", "Click a note to select its node, drag to move the note (right-click/ESC to cancel)"): "点击笔记选择所在节点, 拖动移动笔记(右键/ESC取消)",
+        ("*", "Click a note in the node editor to select its node, drag to move the note"): "在节点编辑器中点击笔记选择所在节点, 拖动移动笔记",
+        ("*", "Group Summaries"): "节点组汇总",
+        ("*", "Groups"): "节点组",
+        ("*", "Show the note count, top categories and pinned note inside node groups on group nodes"): "在组节点上显示节点组内的笔记数、主要分类和置顶笔记",
+        ("*", "Pin"): "置顶",
+        ("*", "Show the first line of this note on group nodes that use this node tree"): "在使用此节点树的组节点上显示这条笔记的首行",
+        ("*", "Also search notes in other node groups and materials"): "同时搜索其它节点组和材质中的笔记",
+        ("*", "Other Node Trees ({count})"): "其它节点树 ({count})",
+        ("*", "Space separated words with prefix and fuzzy matching, #tag matches tags"): "空格分隔多个词, 支持前缀和模糊匹配, #标签 匹配标签",
+        ("*", "Page"): "页",
+        ("*", "Page Size"): "每页数量",
+        ("*", "Current page of the notes list"): "笔记列表的当前页",
+        ("*", "Number of notes shown per page in the notes list"): "笔记列表每页显示的笔记数量",
         ("Operator", "No Text"): "无文本",
         ("*", "No Image"): "无图片",
         ("*", "Text:  None"): "文本:  无",
@@ -181,8 +209,7 @@ translations_dict = {
         ("*", "Width of the shortcut panel"): "弹出面板宽度:",
         ("*", "Shortcut key not registered"): "快捷键未注册",
         ("*", "Node Notes"): "节点笔记",
-        ("*", "Saving v5.0+ files in v4.x results in missing notes when reopening in v5.x."): "5.0以上版本的文件,用4.x打开保存后,5.x存的笔记会丢失.",
-        ("*", "Versions within 4.x are fully compatible. v5.0 can load notes saved in v4.x."): "4.x版本之间兼容没问题. 5.0版本能加载4.x版本保存的笔记.",
+        ("*", "Notes are stored as node custom properties, files can be exchanged between v4.x and v5.x."): "笔记存储为节点自定义属性, 文件可以在4.x和5.x之间互相打开.",
         ("*", "Default Mouse Offset"): "默认鼠标偏移",
         ("*", "Roundness"): "圆角",
         ("*", "Width Mode"): "宽度模式",
@@ -209,6 +236,8 @@ translations_dict = {
         
     },
     "ja_JP": {
+        ("*", "Text Block"): "テキストブロック",
+        ("*", "Use a text datablock as long-form note body"): "テキストデータブロックを長文ノートの本文として使用",
         ("Operator", "Swap Text and Image Position"): "テキストと画像の位置を交換",
         ("Operator", "Delete Text (Multi-Select)"): "テキストを削除（複数選択）",
         ("Operator", "Delete Index (Multi-Select)"): "番号を削除（複数選択）",
@@ -281,7 +310,9 @@ translations_dict = {
         ("*", "External images will be packed into Blend file"): "外部画像はBlendファイルにパックされます",
         ("*", "Images will be unpacked to original or current directory"): "画像は元の場所または現在のディレクトリにアンパックされます",
         ("*", "Please save Blend file first"): "まずBlendファイルを保存してください",
-        ("*", "Jump to the node containing the note"): "ノートを含むノードへ移動",
+        ("*", "Jump to the node containing the note, entering nested node groups if needed"): "ノートを含むノードへ移動し、必要に応じてネストされたノードグループに入る",
+        ("*", "The note is not inside a node group reachable from the current node tree"): "ノートは現在のノードツリーから入れるノードグループ内にありません",
+        ("*", "bpy.data collection of the ID owning the target node tree, empty for the current tree"): "対象ノードツリーを所有する ID の bpy.data コレクション、空の場合は現在のノードツリー",
         ("*", "View image in floating image editor"): "フローティング画像エディタで画像を表示",
         ("*", "External images"): "外部画像",
         ("*", "Already packed"): "パック済み",
@@ -296,14 +327,23 @@ translations_dict = {
         "インタラクティブモード [右クリック/ESCで終了] | マーク済: {node_name} -> #{index}",
         ("*", "Interactive Mode [Right-click/ESC to exit] | Current max index: #{max_idx}"):
         "インタラクティブモード [右クリック/ESCで終了] | 現在の最大番号: #{max_idx}",
-        ("*", "Show text by background color:"): "背景色でテキストを表示:",
-        ("*", "Show text and images by background color:"): "背景色でテキストと画像を表示:",
+        ("*", "Show text by category:"): "カテゴリでテキストを表示:",
+        ("*", "Show text and images by category:"): "カテゴリでテキストと画像を表示:",
+        ("*", "Category"): "カテゴリ",
+        ("*", "Categories"): "カテゴリ数",
+        ("*", "Note category for visibility filtering, 1-6 follow the color presets, 0 = others"): "表示フィルター用のノートカテゴリ。1〜6 は色プリセットに対応、0 はその他",
+        ("*", "Number of note categories shown in the filter row, the first ones follow the color presets"): "フィルター行に表示するカテゴリ数。先頭は色プリセットに対応",
+        ("*", "Toggle Category Visibility"): "カテゴリ表示の切り替え",
+        ("*", "Show or hide notes of this category"): "このカテゴリのノートを表示/非表示",
         ("*", "List ({count})"): "リスト ({count})",
         ("*", "Node:  {name}"): "ノード:  {name}",
         ("*", "Image:  {name}"): "画像:  {name}",
         ("*", "Others"): "その他",
         ("*", "Font Size"): "フォントサイズ",
         ("*", "Line Separator"): "改行区切り",
+        ("*", "Rich Text"): "リッチテキスト",
+        ("*", "Notes are stored as node custom properties, files can be exchanged between v4.x and v5.x."): "ノートはノードのカスタムプロパティとして保存され、v4.xとv5.xの間でファイルを相互に開けます。",
+        ("*", "Parse **bold**, [red]color[/] and leading \"- \" bullets in text notes"): "テキストノートの **太字**、[red]色[/]、行頭の \"- \" 箇条書きを解析",
         ("*", "Background:"): "背景:",
         ("*", "Center"): "中央",
         ("*", "Global Index Settings:"): "番号のグローバル設定:",
@@ -316,6 +356,22 @@ translations_dict = {
         ("*", "Active node required"): "アクティブノードが必要です",
         ("*", "No matching items found"): "一致するアイテムが見つかりません",
         ("*", "No notes yet"): "まだノートがありません",
+        ("Operator", "Drag Note"): "ノートをドラッグ",
+        ("*", "Drag Notes"): "ノートをドラッグ",
+        ("*", "Click a note to select its node, drag to move the note (right-click/ESC to cancel)"): "ノートをクリックしてノードを選択、ドラッグでノートを移動（右クリック/ESCでキャンセル）",
+        ("*", "Click a note in the node editor to select its node, drag to move the note"): "ノードエディターでノートをクリックしてノードを選択、ドラッグでノートを移動",
+        ("*", "Group Summaries"): "グループの概要",
+        ("*", "Groups"): "グループ",
+        ("*", "Show the note count, top categories and pinned note inside node groups on group nodes"): "ノードグループ内のノート数、主なカテゴリ、ピン留めしたノートをグループノードに表示",
+        ("*", "Pin"): "ピン留め",
+        ("*", "Show the first line of this note on group nodes that use this node tree"): "このノードツリーを使うグループノードにこのノートの1行目を表示",
+        ("*", "Also search notes in other node groups and materials"): "他のノードグループやマテリアルのノートも検索",
+        ("*", "Other Node Trees ({count})"): "他のノードツリー ({count})",
+        ("*", "Space separated words with prefix and fuzzy matching, #tag matches tags"): "スペース区切りの単語で前方一致とあいまい検索、#タグでタグを検索",
+        ("*", "Page"): "ページ",
+        ("*", "Page Size"): "ページサイズ",
+        ("*", "Current page of the notes list"): "ノートリストの現在のページ",
+        ("*", "Number of notes shown per page in the notes list"): "ノートリストの1ページに表示するノート数",
         ("*", "No Text"): "テキストなし",
         ("*", "No Image"): "画像なし",
         ("*", "Text:  None"): "テキスト:  なし",
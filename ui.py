@@ -1,9 +1,12 @@
 import bpy
-from bpy.types import Panel, UILayout, Context, Menu, Image
+from bpy.types import Panel, UILayout, Context, Menu, Image, NodeTree
 from .preferences import pref
 from .utils import text_split_lines
 from .nn_typing import NotedNode
 from . import operators as ops
+from .note_list import NoteList, get_note_list
+from .thumbnails import thumbnail_icon
+from .note_data import note_uuid
 from bpy.app.translations import pgettext_iface as iface
 
 class NODE_PT_node_note_gpu_panel(Panel):
@@ -47,21 +50,25 @@ def draw_panel(layout: UILayout, context: Context, show_global=True, show_text=T
             row_pos = body.row()
             row_pos.operator("preferences.addon_show", text="Preferences", icon='PREFERENCES').module = __package__
             row_pos.prop(prefs, "dependent_overlay", text="Overlay", toggle=True, icon='OVERLAY')
+            row_pos.prop(prefs, "show_group_rollups", text="Groups", toggle=True, icon='NODETREE')
             # # todo 还很不完善
             # row_pos.prop(prefs, "use_occlusion", text="Hide when occluded")
 
             if prefs.show_all_notes:
                 _txt = " and images" if prefs.hide_img_by_bg else ""
-                label_text = f"Show text{_txt} by background color:"
+                label_text = f"Show text{_txt} by category:"
                 body.prop(prefs, "hide_img_by_bg", text=label_text, toggle=True, icon='FILTER')
                 split = body.split(factor=0.1, align=True)
                 split.label(text="    ")
-                split.prop(prefs, "show_red", text=def_labels[0], toggle=True)
-                split.prop(prefs, "show_green", text=def_labels[1], toggle=True)
-                split.prop(prefs, "show_blue", text=def_labels[2], toggle=True)
-                split.prop(prefs, "show_orange", text=def_labels[3], toggle=True)
-                split.prop(prefs, "show_purple", text=def_labels[4], toggle=True)
-                split.prop(prefs, "show_other", text="Others", toggle=True)
+                row_category = split.row(align=True)
+                mask = prefs.category_mask
+                for category in [*range(1, prefs.category_count + 1), 0]:
+                    if category == 0:
+                        label = "Others"
+                    else:
+                        label = def_labels[category - 1] if category <= len(def_labels) else str(category)
+                    op = row_category.operator(ops.NODE_OT_note_toggle_category.bl_idname, text=label, depress=bool(mask >> category & 1))
+                    op.category = category
 
     node: NotedNode = context.active_node
     if node:
@@ -71,6 +78,7 @@ def draw_panel(layout: UILayout, context: Context, show_global=True, show_text=T
             h_split = header.row().split(factor=0.4)
             h_split.operator(ops.NODE_OT_note_show_selected_txt.bl_idname, text="Text", icon="HIDE_OFF" if node.note_show_txt else "HIDE_ON")
             h_split.prop(node, "note_text", text="")
+            header.prop(node, "note_pinned", text="", icon='PINNED' if node.note_pinned else 'UNPINNED')
             header.operator(ops.NODE_OT_note_paste_text_from_clipboard.bl_idname, text="", icon='PASTEDOWN')
             header.operator(ops.NODE_OT_note_copy_text_to_clipboard.bl_idname, text="", icon='COPYDOWN')
             header.operator(ops.NODE_OT_note_delete_selected_txt.bl_idname, text="", icon='TRASH')
@@ -82,6 +90,7 @@ def draw_panel(layout: UILayout, context: Context, show_global=True, show_text=T
                 txt_row = txt_box.row()
                 txt_row.prop(node, "note_text", text="")
                 txt_row.operator(ops.NODE_OT_note_text_from_node_label.bl_idname, text="", icon='AUTOMERGE_ON')
+                txt_box.template_ID(node, "note_text_block", new="text.new", open="text.open")
 
                 row_pos = txt_box.column()
                 row_tag = row_pos.row(align=True)
@@ -98,7 +107,9 @@ def draw_panel(layout: UILayout, context: Context, show_global=True, show_text=T
 
                 split_txt = txt_box.split(factor=0.5)
                 split_txt.prop(pref(), "font_path", text="Font")
-                split_txt.prop(pref(), "line_separator", text="Line Separator")
+                row_sep = split_txt.row()
+                row_sep.prop(pref(), "line_separator", text="Line Separator")
+                row_sep.prop(pref(), "use_markup", text="", icon='SMALL_CAPS')
 
                 row_pos = txt_box.row()
                 row_pos.label(text="Background:")
@@ -107,6 +118,8 @@ def draw_panel(layout: UILayout, context: Context, show_global=True, show_text=T
                     split_color.prop(pref(), f"col_preset_{i+1}", text="")
                     op = split_color.operator(ops.NODE_OT_note_apply_preset.bl_idname, text=def_labels[i])
                     op.bg_color = col_vals[i]
+                    op.category = i + 1
+                row_pos.prop(node, "note_category", text="")
 
                 width_row = txt_box.row(align=True)
                 width_row.prop(node, "note_txt_width_mode", text="Width")
@@ -145,7 +158,8 @@ def draw_panel(layout: UILayout, context: Context, show_global=True, show_text=T
                 sub_header, sub_body = img_preview.panel("setting_sub", default_closed=True)
                 sub_header.template_ID(node, "note_image", open="image.open")
                 if sub_body:
-                    sub_body.template_ID_preview(node, "note_image", rows=4, cols=4, filter="AVAILABLE", hide_buttons=True)
+                    if node.note_image:
+                        draw_image_thumbnail(sub_body, node, node.note_image)
                     if node.note_image and node.note_image.packed_file is None:  # type: ignore
                         img_filepath = node.note_image.filepath
                         if img_filepath:
@@ -206,64 +220,65 @@ def draw_panel(layout: UILayout, context: Context, show_global=True, show_text=T
         layout.label(text="Active node required", icon='INFO')
 
     if show_list:
-        search_key = pref().navigator_search.strip().lower()
-        filter_noted_nodes: list[NotedNode] = []
-        all_notes_count = 0
-        
-        for node in context.space_data.edit_tree.nodes:
-            if node.note_text.strip() or node.note_badge_index > 0 or node.note_image:
-                all_notes_count += 1
-                if search_key and (search_key not in node.note_text.lower()):
-                    continue
-                filter_noted_nodes.append(node)
+        tree = context.space_data.edit_tree
+        note_list = get_note_list(tree, prefs.navigator_search.strip().lower(), prefs.list_sort_mode, prefs.search_all_trees)
 
         header, body = layout.panel("setting4", default_closed=True)
-        header.label(text=iface("List ({count})").format(count=all_notes_count), icon="ALIGN_JUSTIFY")
+        header.label(text=iface("List ({count})").format(count=note_list.total), icon="ALIGN_JUSTIFY")
         header.prop(prefs, "list_sort_mode", text="")
         if body:
-            draw_search_list(body, context, filter_noted_nodes, all_notes_count)
+            draw_search_list(body, context, tree, note_list)
 
-def draw_search_list(layout: UILayout, context: Context, filter_noted_nodes: list[NotedNode], all_notes_count: int):
-    row = layout.row(align=True)
-    row.prop(pref(), "navigator_search", text="", icon='VIEWZOOM')
-
-    list_sort_mode = pref().list_sort_mode
-    if list_sort_mode == 'COLOR_BADGE':
-        filter_noted_nodes.sort(key=lambda node: (
-            node.note_txt_bg_color[:3] if node.note_text else (2, 2, 2),
-            node.note_badge_index == 0,
-            node.note_badge_index,
-        ))
+def draw_image_thumbnail(layout: UILayout, node: NotedNode, image: Image, open_op: str = "") -> None:
+    """缓存的小缩略图(生成前显示占位图标), 旁边保留图片的浏览/选择"""
+    row = layout.row()
+    icon_value = thumbnail_icon(image)
+    if icon_value:
+        row.template_icon(icon_value=icon_value, scale=6)
     else:
-        filter_noted_nodes.sort(key=lambda node: (
-            node.note_badge_index == 0,
-            node.note_badge_index,
-            node.note_txt_bg_color[:3] if node.note_text else (2, 2, 2),
-        ))
-    if not filter_noted_nodes and all_notes_count > 0:
+        row.label(text="", icon='IMAGE_DATA')
+    row.template_ID(node, "note_image", open=open_op, filter="AVAILABLE")
+
+def draw_search_list(layout: UILayout, context: Context, tree: NodeTree, note_list: NoteList):
+    prefs = pref()
+    row = layout.row(align=True)
+    row.prop(prefs, "navigator_search", text="", icon='VIEWZOOM')
+    row.prop(prefs, "search_all_trees", text="", icon='NODETREE')
+    draw_other_tree_results(layout, note_list, prefs.list_page_size)
+
+    if not note_list.uuids and note_list.total > 0:
             box = layout.box()
             col = box.column(align=True)
             col.label(text="No matching items found", icon='FILE_SCRIPT')
             return
 
-    if all_notes_count == 0:
+    if note_list.total == 0:
         layout.label(text="No notes yet", icon='INFO')
         return
 
-    list_sort_mode = pref().list_sort_mode
-    if pref().navigator_search.strip().lower():
+    list_sort_mode = prefs.list_sort_mode
+    if prefs.navigator_search.strip().lower():
         sort_icon = 'FILTER'
     elif list_sort_mode == 'BADGE_COLOR':
         sort_icon = 'SORT_ASC'
     else:
         sort_icon = 'COLOR'
 
-    layout.label(text=iface("List ({count})").format(count=len(filter_noted_nodes)), icon=sort_icon)
-    col = layout.column()
+    page_size = prefs.list_page_size
+    page_count = note_list.page_count(page_size)
+    page = context.window_manager.note_list_page
+    row = layout.row()
+    row.label(text=iface("List ({count})").format(count=len(note_list.uuids)), icon=sort_icon)
+    if page_count > 1:
+        # 只为当前页创建子面板
+        row_page = row.row(align=True)
+        row_page.prop(context.window_manager, "note_list_page", text="")
+        row_page.label(text=f"/ {page_count}")
     header: UILayout
     body: UILayout
-    for index, node in enumerate(filter_noted_nodes):
-        header, body = layout.panel(f"note_{index}_{node.name}", default_closed=True)
+    for node in note_list.page(tree, page, page_size):
+        uid = note_uuid(node)
+        header, body = layout.panel(f"note_{uid}", default_closed=True)
         row = header.row(align=True)
         split1 = row.split(factor=0.1)
         split_color = split1.row()
@@ -289,7 +304,7 @@ def draw_search_list(layout: UILayout, context: Context, filter_noted_nodes: lis
             split_lines = text_split_lines(txt_content)
             display_text = split_lines[0]
         op = split_text.operator(ops.NODE_OT_note_jump_to_note.bl_idname, text=display_text, icon='VIEW_ZOOM', emboss=True)
-        op.node_name = node.name
+        op.note_id = uid
 
         image: Image = node.note_image
         split_img_name.label(text=image.name if image else "No Image")
@@ -309,7 +324,7 @@ def draw_search_list(layout: UILayout, context: Context, filter_noted_nodes: lis
                 img_split = note_col.split(factor=0.03)
                 img_split.label(text="")
                 img_box = img_split.box()
-                img_box.template_ID_preview(node, "note_image", open="image.open", rows=4, cols=4, filter="AVAILABLE")
+                draw_image_thumbnail(img_box, node, image, open_op="image.open")
 
             row_text = note_col.column()
             if split_lines:
@@ -321,6 +336,18 @@ def draw_search_list(layout: UILayout, context: Context, filter_noted_nodes: lis
             else:
                 row_text.label(text="Text:  None", icon='FILE_TEXT')
 
+def draw_other_tree_results(layout: UILayout, note_list: NoteList, limit: int):
+    """搜索全部节点树时, 其它节点树中的结果"""
+    if not note_list.others: return
+    box = layout.box()
+    box.label(text=iface("Other Node Trees ({count})").format(count=note_list.other_count), icon='NODETREE')
+    col = box.column(align=True)
+    for other in note_list.others[:limit]:
+        op = col.operator(ops.NODE_OT_note_jump_to_note.bl_idname, text=f"{other.owner_name} › {other.node_name}:  {other.text}", icon='VIEW_ZOOM', translate=False)
+        op.note_id = other.uid
+        op.owner_type = other.owner_type
+        op.owner_name = other.owner_name
+
 def draw_panel_for_shortcut(layout: UILayout, context: Context):
     row = layout.row()
     prefs = pref()
@@ -1,11 +1,46 @@
 import math
-from .preferences import pref
-from .nn_typing import int2, RGBA, Rect
+import numpy as np
+from dataclasses import dataclass
+from .preferences import get_draw_settings
+from .nn_typing import int2, float2, Rect
+from .layout import split_lines
 import bpy
-from bpy.types import Context, Node, Image, SpaceImageEditor
+from bpy.types import Context, Node, Image, Region, SpaceImageEditor
 
 # ==================== 工具函数 ====================
 
+TreeOwnerCollections = ("materials", "worlds", "scenes", "lights", "textures", "linestyles")
+""" 带内嵌节点树的 ID 所在的 bpy.data 集合 """
+
+def iter_owned_trees():
+    """遍历 (bpy.data 集合名, 所属 ID, 节点树): 节点组属于自身, 内嵌节点树属于材质/世界/场景等"""
+    for group in bpy.data.node_groups:
+        yield "node_groups", group, group
+    for collection_name in TreeOwnerCollections:
+        for id_data in getattr(bpy.data, collection_name):
+            tree = getattr(id_data, "node_tree", None)
+            if tree is not None:
+                yield collection_name, id_data, tree
+
+def iter_tree_owners():
+    """遍历文件中所有节点树及其所属 ID"""
+    for _, owner, tree in iter_owned_trees():
+        yield owner, tree
+
+def owned_tree(collection_name: str, owner_name: str):
+    """按所属 ID 的集合名和名字查找节点树, 找不到返回 None"""
+    if collection_name != "node_groups" and collection_name not in TreeOwnerCollections:
+        return None
+    owner = getattr(bpy.data, collection_name).get(owner_name)
+    if owner is None:
+        return None
+    return owner if collection_name == "node_groups" else getattr(owner, "node_tree", None)
+
+def iter_node_trees():
+    """遍历文件中所有节点树(节点组和材质/世界/场景等内嵌节点树)"""
+    for _, tree in iter_tree_owners():
+        yield tree
+
 def ui_scale():
     return bpy.context.preferences.system.ui_scale
 
@@ -24,14 +59,11 @@ def node_depth(node: Node) -> int:
         node = node.parent
     return depth
 
-def text_split_lines(text: str) -> list[str]:
+def text_split_lines(text: str, separator: str | None = None) -> list[str]:
     """使用偏好设置中的分隔符将文本转换为换行"""
-    separator: str = pref().line_separator
-    if not separator:
-        return text.splitlines()
-    for sep in separator.split('|'):
-        text = text.replace(sep, "\n")
-    return text.splitlines()
+    if separator is None:
+        separator = get_draw_settings().line_separator
+    return split_lines(text, separator)
 
 def get_region_zoom(context: Context) -> float:
     """获取节点编辑器的缩放比例"""
@@ -44,24 +76,39 @@ def view_to_region_scaled(x: float, y: float) -> int2:
     """将节点编辑器坐标转换为屏幕坐标（考虑UI缩放）"""
     return bpy.context.region.view2d.view_to_region(x * ui_scale(), y * ui_scale(), clip=False)
 
-def _color_equal(c1: RGBA, c2: RGBA, tol: float = 0.001) -> bool:
-    return all(abs(a - b) < tol for a, b in zip(c1, c2))
-
-def check_color_visibility(color: RGBA) -> bool:
-    """检查背景颜色是否可见（用于过滤显示）"""
-    prefs = pref()
-    if _color_equal(color, prefs.col_preset_1):
-        return prefs.show_red
-    if _color_equal(color, prefs.col_preset_2):
-        return prefs.show_green
-    if _color_equal(color, prefs.col_preset_3):
-        return prefs.show_blue
-    if _color_equal(color, prefs.col_preset_4):
-        return prefs.show_orange
-    if _color_equal(color, prefs.col_preset_5):
-        return prefs.show_purple
-
-    return prefs.show_other
+@dataclass(frozen=True)
+class ViewTransform:
+    """节点编辑器坐标 -> 区域像素的仿射变换(已含 UI 缩放), 与 view_to_region_scaled 等价"""
+    origin_x: float
+    origin_y: float
+    scale_x: float
+    scale_y: float
+    zoom: float
+    """ 与 get_region_zoom 相同 """
+    ui_scale: float
+
+    def to_region(self, x: float, y: float) -> float2:
+        return self.origin_x + x * self.scale_x, self.origin_y + y * self.scale_y
+
+    def to_region_array(self, xy: np.ndarray) -> np.ndarray:
+        """批量转换 (..., 2) 坐标数组"""
+        return xy * (self.scale_x, self.scale_y) + (self.origin_x, self.origin_y)
+
+ViewSpan = 10000
+""" 求变换时两个参考点的间距, 越大舍入误差越小 """
+
+def get_view_transform(context: Context) -> ViewTransform:
+    return region_view_transform(context.region)
+
+def region_view_transform(region: Region) -> ViewTransform:
+    """view2d 的 view_to_region 是线性的, 用两个参考点一次求出整个变换"""
+    view2d = region.view2d
+    x0, y0 = view2d.view_to_region(0, 0, clip=False)
+    x1, y1 = view2d.view_to_region(ViewSpan, ViewSpan, clip=False)
+    sx, sy = (x1 - x0) / ViewSpan, (y1 - y0) / ViewSpan
+    zoom = 1.0 if x1 == x0 else math.hypot(sx, sy)
+    ui = ui_scale()
+    return ViewTransform(x0, y0, sx * ui, sy * ui, zoom, ui)
 
 def get_node_screen_rect(node: Node) -> Rect:
     """获取节点在屏幕空间中的矩形区域"""
@@ -0,0 +1,148 @@
+import bpy
+import time
+from typing import Iterator
+from bpy.app.handlers import persistent
+from .layout import layout_note
+from bpy.types import NodeTree
+from .node_snapshot import NodeHierarchy, NodeSnapshot, take_snapshot
+from .preferences import get_draw_settings
+from .registry import noted_indices, find_node
+from .utils import ViewTransform, iter_node_trees, region_view_transform
+from . import draw_gpu
+from . import cache_manager
+
+# 加载文件后利用空闲时间预热缓存: 登记表, 文本测量与换行, 图片纹理
+# 工作拆成小片在定时器中执行, 每次不超过时间预算; 用户开始操作(运行算子/拖动等模态操作/缩放平移视图)或撤销/重做后取消, 剩余部分在绘制时按需计算
+# 文本排版与缩放有关, 只按打开的节点编辑器当前视图预热, 没有打开节点编辑器时跳过
+
+StartDelay = 0.5
+""" 加载后等待界面完成首次绘制 """
+TickBudget = 0.004
+""" 每次定时器回调的工作时间上限(秒) """
+TickInterval = 0.05
+
+_jobs: Iterator[None] | None = None
+_interaction: tuple | None = None
+""" 上一次定时器回调时的操作状态和视图, 变化即视为用户开始操作 """
+_trees: dict[int, NodeTree] = {}
+""" 本次定时器回调中的节点树, 回调结束即丢弃 """
+_resolved: dict[int, tuple[NodeTree, NodeSnapshot, NodeHierarchy]] = {}
+
+def _interaction_state() -> tuple:
+    wm = bpy.context.window_manager
+    operators = wm.operators
+    # Window.modal_operators 需要 4.2+
+    modal_count = sum(len(getattr(window, "modal_operators", ())) for window in wm.windows)
+    # 滚轮缩放/平移等视图操作不登记到 wm.operators, 比较视图变换发现
+    views = tuple(region_view_transform(region) for window in wm.windows for area in window.screen.areas
+                  if area.type == 'NODE_EDITOR' for region in area.regions if region.type == 'WINDOW')
+    return len(operators), operators[-1].as_pointer() if len(operators) else 0, modal_count, views
+
+def _editor_views() -> dict[int, ViewTransform]:
+    """打开的节点编辑器: 节点树指针 -> 视图变换"""
+    views: dict[int, ViewTransform] = {}
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type != 'NODE_EDITOR': continue
+            tree = area.spaces.active.edit_tree
+            region = next((region for region in area.regions if region.type == 'WINDOW'), None)
+            if tree is not None and region is not None:
+                views.setdefault(tree.as_pointer(), region_view_transform(region))
+    return views
+
+def _resolve(tree_ptr: int) -> tuple[NodeTree, NodeSnapshot, NodeHierarchy] | None:
+    """按指针重新查找节点树并读取快照, 同一次定时器回调内复用"""
+    resolved = _resolved.get(tree_ptr)
+    if resolved is None:
+        tree = _trees.get(tree_ptr)
+        if tree is None: return None
+        nodes = tree.nodes
+        noted = noted_indices(tree)
+        snap = take_snapshot(nodes, noted)
+        resolved = _resolved[tree_ptr] = (tree, snap, NodeHierarchy(nodes, snap, noted))
+    return resolved
+
+def _iter_jobs() -> Iterator[None]:
+    """每次 yield 为一个工作片: 登记一棵节点树或预热一个笔记
+    工作片之间只保留指针和笔记标识, 撤销/删除节点后每片重新查找, 不持有失效的 RNA 引用"""
+    views = _editor_views()
+    fallback = next(iter(views.values()), None)
+    settings = get_draw_settings()
+    metrics = draw_gpu.get_font_metrics()
+    for tree_ptr in list(_trees):
+        resolved = _resolve(tree_ptr)
+        if resolved is None: continue
+        tree, snap, _ = resolved
+        uids = [uid for uid in snap.uuids if uid]
+        yield
+        if not uids: continue
+        view = views.get(tree_ptr, fallback)
+        params = draw_gpu.layout_params(view, settings) if view is not None else None
+        for uid in uids:
+            resolved = _resolve(tree_ptr)
+            if resolved is None: break
+            tree, snap, hierarchy = resolved
+            node = find_node(tree, uid)
+            i = tree.nodes.find(node.name) if node is not None else -1
+            if i < 0 or i >= snap.count: continue
+            if params is not None:
+                layout_note(draw_gpu.note_record(node, snap, hierarchy, i), (0, 0, 0, 0), params, metrics)  # type: ignore
+            image = node.note_image  # type: ignore
+            if image is not None and not bpy.app.background:
+                draw_gpu.get_gpu_texture(image)
+            yield
+
+def _tick() -> float | None:
+    global _jobs, _trees, _interaction
+    if _jobs is None: return None
+    state = _interaction_state()
+    # 加载时视图还没有初始化, 第一次回调才记录视图
+    if _interaction is None or state[:-1] != _interaction[:-1] or _interaction[-1] not in (None, state[-1]):
+        _jobs = None
+        return None
+    _interaction = state
+    if bpy.context.window_manager.is_interface_locked:
+        return TickInterval
+    _trees = {tree.as_pointer(): tree for tree in iter_node_trees()}
+    _resolved.clear()
+    deadline = time.perf_counter() + TickBudget
+    try:
+        while time.perf_counter() < deadline:
+            next(_jobs)
+    except (StopIteration, ReferenceError):
+        # 完成, 或节点树在预热期间被删除
+        _jobs = None
+        return None
+    finally:
+        _trees = {}
+        _resolved.clear()
+    return TickInterval
+
+def start_warmup() -> None:
+    global _jobs, _interaction
+    _jobs = _iter_jobs()
+    _interaction = (*_interaction_state()[:-1], None)
+    if not bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.register(_tick, first_interval=StartDelay)
+
+def cancel_warmup() -> None:
+    global _jobs
+    _jobs = None
+    if bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.unregister(_tick)
+
+@persistent
+def _on_load_post(*args) -> None:
+    if not bpy.app.background:
+        start_warmup()
+
+def register() -> None:
+    # 撤销/重做/加载时先取消, 加载后再由 load_post 重新开始(cache_manager 的处理函数先注册, 先执行)
+    cache_manager.register_cache("warmup", cancel_warmup)
+    bpy.app.handlers.load_post.append(_on_load_post)
+
+def unregister() -> None:
+    if _on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load_post)
+    cache_manager.unregister_cache("warmup")
+    cancel_warmup()